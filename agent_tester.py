@@ -6,41 +6,63 @@ This is primarily for development and testing purposes.
 """
 
 import asyncio
-from agents import Runner, Agent
+import importlib
+from cached_runner import run_cached
+from openai_client import use_shared_client
+from commands import ORDER_IDENTIFY_CMD, BC_POST_CMD
+
+# A single event loop reused for every agent run in this process, so the shared
+# OpenAI client and its connection pool survive between runs
+_LOOP = asyncio.new_event_loop()
+asyncio.set_event_loop(_LOOP)
+
+# Module and attribute of each agent, imported lazily by get_agent
+_AGENT_FACTORIES: dict[str, tuple[str, str]] = {
+    "hello": ("hello_world_agent_example", "agent"),
+    "weather": ("function_agent_example", "agent"),
+    "triage": ("handsoff_agent_example", "triage_agent"),
+    "email": ("email_agent", "email_agent"),
+    "order": ("order_agent", "order_agent"),
+    "bc": ("bc_agent", "bc_agent"),
+}
+
+# Default input for each agent when none is given on the command line
+_DEFAULT_INPUTS: dict[str, str] = {
+    "hello": "Write a haiku about recursion in programming.",
+    "weather": "What's the weather in Tokyo?",
+    "triage": "Hola, ¿cómo estás?",
+    "email": "Fetch 5 emails from my inbox using credentials_path='credentials.json'",
+    "order": ORDER_IDENTIFY_CMD,
+    "bc": BC_POST_CMD,
+}
+
+# Available agents and their descriptions
+_AGENTS_HELP = (
+    ("hello", "Basic agent without tools (hello_world.py)"),
+    ("weather", "Weather agent with function tool (function_example.py)"),
+    ("triage", "Language triage agent with handoffs (handsoff_example.py)"),
+    ("email", "Email agent with multiple tools (email_agent.py)"),
+    ("order", "Order identification agent with GPT-4o vision (order_agent.py)"),
+    ("bc", "Business Central agent for posting orders (bc_agent.py)"),
+)
+
+# Help text printed by list_available_agents, built once at import
+_AGENTS_HELP_TEXT = "\n".join(
+    ["Available agents for testing:"]
+    + [f"  - {key}: {description}" for key, description in _AGENTS_HELP]
+    + [
+        "\nUsage: python agent_tester.py <agent_name> [input_text]",
+        "Example: python agent_tester.py weather \"What's the weather in Tokyo?\"",
+        "Example: python agent_tester.py triage \"Hola, ¿cómo estás?\"",
+        "Example: python agent_tester.py order \"Identify orders from all emails\"",
+        "Example: python agent_tester.py bc \"Post order from emails/email_195a1c2f3e4d5b6a/identified_order.json\"",
+        "\nNote: For orchestration workflow, use orchestration_runner.py instead.",
+    ]
+)
 
 def list_available_agents():
     """List all available agents in the project."""
-    agents = {
-        "hello": "Basic agent without tools (hello_world.py)",
-        "weather": "Weather agent with function tool (function_example.py)",
-        "triage": "Language triage agent with handoffs (handsoff_example.py)",
-        "email": "Email agent with multiple tools (email_agent.py)",
-        "order": "Order identification agent with GPT-4o vision (order_agent.py)",
-        "bc": "Business Central agent for posting orders (bc_agent.py)"
-    }
-    
-    print("Available agents for testing:")
-    for key, description in agents.items():
-        print(f"  - {key}: {description}")
-    print("\nUsage: python agent_tester.py <agent_name> [input_text]")
-    print("Example: python agent_tester.py weather \"What's the weather in Tokyo?\"")
-    print("Example: python agent_tester.py triage \"Hola, ¿cómo estás?\"")
-    print("Example: python agent_tester.py order \"Identify orders from all emails\"")
-    print("Example: python agent_tester.py bc \"Post order from emails/email_20250314_112347/identified_order.json\"")
-    print("\nNote: For orchestration workflow, use orchestration_runner.py instead.")
-
-def run_agent_sync(agent, input_text):
-    """Run an agent synchronously using the OpenAI Agent SDK Runner.run_sync method."""
-    print(f"Running agent: {agent.name}")
-    print(f"Input: {input_text}")
-    print("-" * 50)
-    
-    # Use the Runner.run_sync method from the OpenAI Agent SDK
-    result = Runner.run_sync(agent, input_text)
-    
-    print("\nResult:")
-    print(result.final_output)
-    return result
+    print(_AGENTS_HELP_TEXT)
 
 async def run_agent_async(agent, input_text):
     """Run an agent asynchronously using the OpenAI Agent SDK Runner.run method."""
@@ -48,41 +70,34 @@ async def run_agent_async(agent, input_text):
     print(f"Input: {input_text}")
     print("-" * 50)
     
-    # Use the Runner.run method from the OpenAI Agent SDK
-    result = await Runner.run(agent, input=input_text)
+    # Use the Runner.run method from the OpenAI Agent SDK (through the execution cache)
+    use_shared_client()
+    result = await run_cached(agent, input=input_text)
     
     print("\nResult:")
     print(result.final_output)
     return result
 
+def run_many(pairs):
+    """Run several (agent, input_text) pairs concurrently on the shared event loop."""
+    return _LOOP.run_until_complete(
+        asyncio.gather(*[run_agent_async(agent, input_text) for agent, input_text in pairs])
+    )
+
 def get_agent(agent_name):
     """Import and return the specified agent."""
+    factory = _AGENT_FACTORIES.get(agent_name)
+    if factory is None:
+        print(f"Error: Unknown agent '{agent_name}'")
+        list_available_agents()
+        return None
+    
+    module_name, attribute = factory
     try:
-        if agent_name == "hello":
-            from hello_world_agent_example import agent
-            return agent, False  # False indicates sync is preferred
-        elif agent_name == "weather":
-            from function_agent_example import agent
-            return agent, True  # True indicates async is preferred
-        elif agent_name == "triage":
-            from handsoff_agent_example import triage_agent
-            return triage_agent, True
-        elif agent_name == "email":
-            from email_agent import email_agent
-            return email_agent, True
-        elif agent_name == "order":
-            from order_agent import order_agent
-            return order_agent, True
-        elif agent_name == "bc":
-            from bc_agent import bc_agent
-            return bc_agent, True
-        else:
-            print(f"Error: Unknown agent '{agent_name}'")
-            list_available_agents()
-            return None, None
+        return getattr(importlib.import_module(module_name), attribute)
     except ImportError as e:
         print(f"Error importing agent: {e}")
-        return None, None
+        return None
 
 # Example usage:
 if __name__ == "__main__":
@@ -102,7 +117,7 @@ if __name__ == "__main__":
         sys.exit(0)
     
     # Get the agent
-    agent, use_async = get_agent(agent_name)
+    agent = get_agent(agent_name)
     if not agent:
         sys.exit(1)
     
@@ -110,22 +125,8 @@ if __name__ == "__main__":
     if len(sys.argv) > 2:
         input_text = " ".join(sys.argv[2:])
     else:
-        # Default inputs for each agent
-        if agent_name == "hello":
-            input_text = "Write a haiku about recursion in programming."
-        elif agent_name == "weather":
-            input_text = "What's the weather in Tokyo?"
-        elif agent_name == "triage":
-            input_text = "Hola, ¿cómo estás?"
-        elif agent_name == "email":
-            input_text = "Fetch 5 emails from my inbox using credentials_path='credentials.json'"
-        elif agent_name == "order":
-            input_text = "Identify orders from all emails in the emails directory"
-        elif agent_name == "bc":
-            input_text = "Post all identified orders to Business Central"
+        # Default input for the agent
+        input_text = _DEFAULT_INPUTS.get(agent_name, "")
     
     # Run the agent
-    if use_async:
-        asyncio.run(run_agent_async(agent, input_text))
-    else:
-        run_agent_sync(agent, input_text) 
\ No newline at end of file
+    _LOOP.run_until_complete(run_agent_async(agent, input_text)) 
\ No newline at end of file
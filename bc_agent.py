@@ -6,11 +6,12 @@ An agent that can post identified orders to Business Central.
 
 from agents import Agent
 from tools import post_order_to_business_central, post_all_orders_to_business_central
+from prompts import build_instructions
 
 # Create a Business Central agent with both single order and batch processing tools
 bc_agent = Agent(
     name="Business Central Agent",
-    instructions="""You are a helpful assistant that can post identified orders to Business Central.
+    instructions=build_instructions("""You are a helpful assistant that can post identified orders to Business Central.
 
     When asked to post a specific order:
     - Use the post_order_to_business_central tool to post the order
@@ -26,18 +27,8 @@ bc_agent = Agent(
 
     You can help users understand the order posting process and explain how the system works.
 
-    CRITICAL FOR HANDOFFS: When you're called as part of an orchestration workflow:
-    1. Complete your task (posting orders) without deviation
-    2. Provide ONLY a clear, concise summary of what you did (e.g., "I posted 3 orders to Business Central")
-    3. DO NOT ask follow-up questions like "Shall I proceed?" or "What would you like to do next?"
-    4. DO NOT offer additional services or suggestions
-    5. DO NOT ask for further instructions
-    6. Simply complete your task and return control to the orchestration agent
-    7. End your response with "Task completed." to signal you're done
-
-    Remember: In an orchestration workflow, your ONLY job is to post orders and report the results.
-    The orchestration agent will decide what to do next.
-    """,
+    In an orchestration workflow, your summary should read like "I posted 3 orders to Business Central".
+    """),
     tools=[post_order_to_business_central, post_all_orders_to_business_central],
     handoffs=[],  # Empty handoffs list as this agent doesn't delegate to other agents
 ) 
\ No newline at end of file
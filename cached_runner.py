@@ -0,0 +1,95 @@
+"""
+Cached Runner
+
+A thin execution-cache layer around the OpenAI Agent SDK Runner.
+Results are stored on disk keyed by a fingerprint of the agent and its input, so
+repeated runs with identical input return the previous final output without an LLM call.
+
+The cache is disabled by default because the specialized agents have side effects
+(fetching emails, posting orders). Set AGENT_CACHE=1 to enable it.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from agents import Runner
+
+# Directory where cached results are stored
+CACHE_DIR = Path(os.getenv('AGENT_CACHE_DIR', Path.home() / '.agent_cache'))
+
+class CachedResult:
+    """Lightweight stand-in for a RunResult restored from the cache."""
+
+    def __init__(self, final_output):
+        self.final_output = final_output
+
+def _cache_enabled():
+    """Return True if the execution cache has been enabled through the environment."""
+    return os.getenv('AGENT_CACHE', '').lower() in ('1', 'true', 'yes')
+
+def _cache_path(agent, input_text):
+    """Return the cache file path for the given agent and input."""
+    key = hashlib.sha256(f"{agent.name}{agent.instructions}{input_text}".encode('utf-8')).hexdigest()
+    return CACHE_DIR / f"{key}.json"
+
+def _load(cache_file):
+    """Load a cached result, or return None on a miss."""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return CachedResult(json.load(f)["final_output"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+def _store(cache_file, result):
+    """Store the final output of a run in the cache."""
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump({"final_output": result.final_output}, f, ensure_ascii=False)
+    except (OSError, TypeError) as e:
+        logging.warning(f"Could not write agent cache entry {cache_file}: {str(e)}")
+
+async def run_cached(agent, input):
+    """Run an agent with Runner.run, returning a cached result if one exists."""
+    if not _cache_enabled():
+        return await Runner.run(agent, input=input)
+
+    cache_file = _cache_path(agent, input)
+    cached = _load(cache_file)
+    if cached is not None:
+        logging.info(f"Agent cache hit for {agent.name}")
+        return cached
+
+    result = await Runner.run(agent, input=input)
+    _store(cache_file, result)
+    return result
+
+async def run_streamed_cached(agent, input, ready):
+    """Run an agent with Runner.run_streamed and set the ready event once its tool calls are done.
+
+    ready is set when the agent starts streaming its final message after a tool call (or when the
+    run ends), so callers can start dependent work while the final message is still being generated.
+    """
+    try:
+        cache_file = _cache_path(agent, input) if _cache_enabled() else None
+        if cache_file:
+            cached = _load(cache_file)
+            if cached is not None:
+                logging.info(f"Agent cache hit for {agent.name}")
+                return cached
+
+        result = Runner.run_streamed(agent, input=input)
+        tool_output_seen = False
+        async for event in result.stream_events():
+            if event.type == "run_item_stream_event" and event.item.type == "tool_call_output_item":
+                tool_output_seen = True
+            elif tool_output_seen and event.type == "raw_response_event" and event.data.type == "response.output_text.delta":
+                ready.set()
+
+        if cache_file:
+            _store(cache_file, result)
+        return result
+    finally:
+        ready.set()
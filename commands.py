@@ -0,0 +1,15 @@
+"""
+Commands
+
+Standard commands passed as input to the agents.
+The orchestration agent's instructions and the runners use these constants so the
+commands are byte-identical everywhere, which keeps cache keys and prompt prefixes stable.
+"""
+
+# Command that runs the complete workflow in orchestration_runner.py
+RUN_WORKFLOW_CMD = "Run the complete workflow"
+
+# Commands for each specialized agent in the workflow
+EMAIL_FETCH_CMD = "Fetch all emails from my inbox using credentials_path='credentials.json'"
+ORDER_IDENTIFY_CMD = "Identify orders from all emails in the emails directory"
+BC_POST_CMD = "Post all identified orders to Business Central"
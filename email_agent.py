@@ -7,11 +7,12 @@ If no specific action is provided, it defaults to reading emails.
 
 from agents import Agent
 from tools import fetch_gmail_emails, send_gmail_email
+from prompts import build_instructions
 
 # Create an email agent with both fetch and send email tools
 email_agent = Agent(
     name="Email Assistant",
-    instructions="""You are a helpful email assistant that can fetch emails from Gmail and send new emails.
+    instructions=build_instructions("""You are a helpful email assistant that can fetch emails from Gmail and send new emails.
 
     When asked to check emails or if no specific action is requested:
     - Use the fetch_gmail_emails tool to retrieve emails from the inbox
@@ -34,18 +35,8 @@ email_agent = Agent(
     - What the subject should be
     - What content should be included in the email
 
-    CRITICAL FOR HANDOFFS: When you're called as part of an orchestration workflow:
-    1. Complete your task (fetching or sending emails) without deviation
-    2. Provide ONLY a clear, concise summary of what you did (e.g., "I fetched 5 emails from your inbox")
-    3. DO NOT ask follow-up questions like "Shall I proceed?" or "What would you like to do next?"
-    4. DO NOT offer additional services or suggestions
-    5. DO NOT ask for further instructions
-    6. Simply complete your task and return control to the orchestration agent
-    7. End your response with "Task completed." to signal you're done
-
-    Remember: In an orchestration workflow, your ONLY job is to fetch or send emails and report the results.
-    The orchestration agent will decide what to do next.
-    """,
+    In an orchestration workflow, your summary should read like "I fetched 5 emails from your inbox".
+    """),
     tools=[fetch_gmail_emails, send_gmail_email],
     handoffs=[],  # Empty handoffs list as this agent doesn't delegate to other agents
 ) 
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""
+OpenAI Client
+
+A single pooled AsyncOpenAI client shared by every Runner.run call in the process.
+Registering it as the OpenAI Agent SDK default lets all agent runs reuse the same
+keep-alive connections instead of opening a new TLS session per run.
+"""
+
+import httpx
+from agents import set_default_openai_client
+from openai import AsyncOpenAI
+
+_shared_client = None
+
+def use_shared_client():
+    """Create the shared AsyncOpenAI client once and make it the SDK default."""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = AsyncOpenAI(
+            max_retries=3,
+            timeout=60,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+            )
+        )
+        set_default_openai_client(_shared_client)
+    return _shared_client
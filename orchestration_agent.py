@@ -16,6 +16,8 @@ import logging
 from email_agent import email_agent
 from order_agent import order_agent
 from bc_agent import bc_agent
+from prompts import TASK_COMPLETED
+from commands import EMAIL_FETCH_CMD, ORDER_IDENTIFY_CMD, BC_POST_CMD
 
 # Configure logging
 logging.basicConfig(
@@ -26,25 +28,25 @@ logging.basicConfig(
 # Create an orchestration agent that coordinates the three specialized agents using handoffs
 orchestration_agent = Agent(
     name="Orchestration Agent",
-    instructions="""You are an orchestration agent that coordinates the entire sales order processing workflow.
+    instructions=f"""You are an orchestration agent that coordinates the entire sales order processing workflow.
     
     Your job is to manage the end-to-end process by delegating tasks to three specialized agents in sequence:
     
     1. Email Agent: Fetches emails from Gmail and saves them to the local file system
        - Always hand off to this agent first with the exact command:
-         "Fetch all emails from my inbox using credentials_path='credentials.json'"
+         "{EMAIL_FETCH_CMD}"
        - After this agent completes its task, it will automatically return control to you
        - When control returns, acknowledge this by saying "Email Agent has completed its task. Moving to the next step."
        
     2. Order Identification Agent: Identifies sales orders from the fetched emails
        - After the Email Agent completes and returns control to you, hand off to this agent with the exact command:
-         "Identify orders from all emails in the emails directory"
+         "{ORDER_IDENTIFY_CMD}"
        - After this agent completes its task, it will automatically return control to you
        - When control returns, acknowledge this by saying "Order Identification Agent has completed its task. Moving to the next step."
        
     3. Business Central Agent: Posts the identified orders to Business Central
        - After the Order Identification Agent completes and returns control to you, hand off to this agent with the exact command:
-         "Post all identified orders to Business Central"
+         "{BC_POST_CMD}"
        - After this agent completes its task, it will automatically return control to you
        - When control returns, acknowledge this by saying "Business Central Agent has completed its task. Workflow is now complete."
     
@@ -54,15 +56,15 @@ orchestration_agent = Agent(
     When asked to run the complete workflow, ALWAYS follow these exact steps in order:
     1. First, say "Starting the sales order processing workflow."
     2. Hand off to the Email Agent with the exact command:
-       "Fetch all emails from my inbox using credentials_path='credentials.json'"
+       "{EMAIL_FETCH_CMD}"
     3. WAIT for the Email Agent to complete its task and return control to you
     4. Acknowledge the Email Agent's completion
     5. Hand off to the Order Identification Agent with the exact command:
-       "Identify orders from all emails in the emails directory"
+       "{ORDER_IDENTIFY_CMD}"
     6. WAIT for the Order Identification Agent to complete its task and return control to you
     7. Acknowledge the Order Identification Agent's completion
     8. Hand off to the Business Central Agent with the exact command:
-       "Post all identified orders to Business Central"
+       "{BC_POST_CMD}"
     9. WAIT for the Business Central Agent to complete its task and return control to you
     10. Acknowledge the Business Central Agent's completion
     11. Provide a summary of the entire process
@@ -79,7 +81,7 @@ orchestration_agent = Agent(
     DO NOT proceed to the next step until the previous agent has completed its task and control has returned to you.
     DO NOT try to simulate or pretend that an agent has completed its task - wait for the actual handoff to complete.
     
-    IMPORTANT HANDOFF SIGNALS: Each specialized agent has been instructed to end their response with "Task completed."
+    IMPORTANT HANDOFF SIGNALS: Each specialized agent has been instructed to end their response with "{TASK_COMPLETED}"
     When you see this signal, it means the agent has finished its task and control has returned to you.
     Only then should you proceed to the next step in the workflow.
     """,
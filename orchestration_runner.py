@@ -2,153 +2,310 @@
 Orchestration Runner
 
 A script for running the sales order processing workflow using the OpenAI Agent SDK.
-This script implements an explicit handoff mechanism for OpenAI Agent SDK version 0.0.3.
+The complete workflow runs the Email, Order Identification and Business Central agents
+directly in a fixed order and only uses an LLM for the final summary. The orchestration
+agent is kept as a fallback for specific tasks that do not match a specialized agent.
 """
 
 import asyncio
+import importlib
+import json
+import os
+import re
+import shutil
 import sys
-from agents import Runner
-from agents.tracing import trace
+from pathlib import Path
+from cached_runner import run_cached, run_streamed_cached
+from agents.tracing import custom_span, trace
+from openai_client import use_shared_client
+from prompts import TASK_COMPLETED
+from commands import RUN_WORKFLOW_CMD, EMAIL_FETCH_CMD, ORDER_IDENTIFY_CMD, BC_POST_CMD
 
-# Import the specialized agents
-from email_agent import email_agent
-from order_agent import order_agent
-from bc_agent import bc_agent
-from orchestration_agent import orchestration_agent
+# The specialized agents are imported lazily (see load_agent) so that a specific task
+# only pays the import cost of the agent it actually uses.
+
+# Routing table for specific tasks: (keyword pattern, agent module, display name)
+# Inputs that match no pattern are handled by the orchestration agent.
+ROUTE_TABLE = [
+    (re.compile(r"fetch email|check email", re.IGNORECASE), "email_agent", "Email Agent"),
+    (re.compile(r"identify order|find order", re.IGNORECASE), "order_agent", "Order Identification Agent"),
+    (re.compile(r"post order|business central", re.IGNORECASE), "bc_agent", "Business Central Agent"),
+]
+
+def load_agent(module_name: str):
+    """Import an agent module on demand and return the agent it defines (e.g. email_agent.email_agent)."""
+    return getattr(importlib.import_module(module_name), module_name)
+
+# Directory the Email Agent saves emails to, and the snapshot used for speculative order identification
+EMAILS_DIR = Path("emails")
+SPECULATIVE_EMAILS_DIR = Path(".emails_speculative")
+
+# Files written by the order identification and Business Central steps, which are left out of the
+# speculative snapshot so a previous run's order can never be adopted (unchanged emails are answered
+# from the order memo instead)
+SNAPSHOT_IGNORED_FILES = ("identified_order.json", "bc_response.json")
+
+def fingerprint_email_folders(emails_dir: Path) -> dict:
+    """Map the content hash of each email folder to the folders with that content."""
+    # Imported here, like the agents, so specific tasks do not pay for loading the tools module
+    from tools import email_folder_hash
+    
+    folders = {}
+    if not emails_dir.exists():
+        return folders
+    
+    for email_folder in sorted(p for p in emails_dir.iterdir() if p.is_dir()):
+        folders.setdefault(email_folder_hash(email_folder), []).append(email_folder)
+    return folders
+
+def link_or_copy(src: str, dst: str) -> None:
+    """Hard-link a file, falling back to a copy where links are not supported (e.g. across devices)."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def snapshot_emails_dir() -> dict:
+    """Snapshot the previous run's emails into the speculative directory and return their fingerprint.
+    
+    Files are hard-linked rather than copied, so large attachments cost no extra I/O. Files written
+    later (content.txt) are replaced rather than rewritten in place, so the
+    snapshot is not affected when the email fetch moves the emails directory aside.
+    """
+    from tools import resume_order_identification
+    
+    shutil.rmtree(SPECULATIVE_EMAILS_DIR, ignore_errors=True)
+    resume_order_identification(SPECULATIVE_EMAILS_DIR)
+    if not EMAILS_DIR.exists():
+        return {}
+    shutil.copytree(
+        EMAILS_DIR, 
+        SPECULATIVE_EMAILS_DIR, 
+        ignore=shutil.ignore_patterns(*SNAPSHOT_IGNORED_FILES), 
+        copy_function=link_or_copy
+    )
+    return fingerprint_email_folders(SPECULATIVE_EMAILS_DIR)
+
+def adopt_speculative_orders(snapshot: dict, fetched: dict) -> bool:
+    """Copy identified orders from the speculative snapshot into the matching freshly fetched email folders.
+    
+    Orders are only adopted if the speculative run identified every snapshot folder in this run
+    (it may have failed on a folder or not called the tool at all); returns False otherwise.
+    """
+    identified_orders = {}
+    for folder_hash, snapshot_folders in snapshot.items():
+        identified_order = snapshot_folders[0] / "identified_order.json"
+        if not all((folder / "identified_order.json").exists() for folder in snapshot_folders):
+            return False
+        identified_orders[folder_hash] = identified_order
+    
+    for folder_hash, identified_order in identified_orders.items():
+        for fetched_folder in fetched[folder_hash]:
+            shutil.copy2(identified_order, fetched_folder / "identified_order.json")
+    return True
+
+async def stop_speculation(speculative_task: asyncio.Task) -> None:
+    """Cancel the speculative order identification and wait until its tool threads stop writing to the snapshot.
+    
+    Cancelling the task does not stop a tool already running in a worker thread, so the tools are also told
+    to skip the remaining email folders, and the emails being identified are waited for.
+    """
+    from tools import cancel_order_identification, wait_for_order_identification
+    
+    cancel_order_identification(SPECULATIVE_EMAILS_DIR)
+    speculative_task.cancel()
+    await asyncio.gather(speculative_task, return_exceptions=True)
+    await asyncio.to_thread(wait_for_order_identification, SPECULATIVE_EMAILS_DIR)
+
+async def start_step(agent, input_text: str) -> asyncio.Task:
+    """Start a streamed agent run and return its task as soon as the agent's tool calls are done.
+    
+    The agent's final message is still being generated when this returns, so the next step can
+    start while it finishes. Await the returned task for the result.
+    """
+    ready = asyncio.Event()
+    task = asyncio.create_task(run_streamed_cached(agent, input_text, ready))
+    await ready.wait()
+    if task.done():
+        # Surface errors before the next step starts
+        task.result()
+    return task
+
+def acknowledge(agent, result) -> None:
+    """Acknowledge a specialized agent's completion locally instead of asking the orchestration agent."""
+    if result.final_output.rstrip().endswith(TASK_COMPLETED):
+        print(f"\n{agent.name} has completed its task. Moving to the next step.")
+    else:
+        print(f"\nWarning: {agent.name} did not signal \"{TASK_COMPLETED}\". Moving to the next step.")
+
+BANNER_LINE = "=" * 80
+
+def print_banner(title: str, *lines: str) -> None:
+    """Print a banner with the given title, followed by any extra lines, in a single write."""
+    print("\n".join((f"\n{BANNER_LINE}", title, BANNER_LINE) + lines))
 
 def print_usage() -> None:
     """Print usage information for the script."""
-    print("\nUsage:")
-    print("  python orchestration_runner.py [input_text]")
-    print("\nExamples:")
-    print("  python orchestration_runner.py \"Run the complete workflow\"")
-    print("  python orchestration_runner.py \"Fetch emails and identify orders\"")
-    print("  python orchestration_runner.py \"Check for new orders and post to Business Central\"")
-    print("\nIf no input is provided, the default is to run the complete workflow.")
-
-async def run_explicit_workflow() -> None:
-    """Run the workflow with explicit handoffs between agents."""
-    print("\n================================================================================")
-    print("RUNNING ORCHESTRATION WITH EXPLICIT HANDOFFS")
-    print("================================================================================")
+    print("\n".join((
+        "\nUsage:",
+        "  python orchestration_runner.py [input_text]",
+        "\nExamples:",
+        f"  python orchestration_runner.py \"{RUN_WORKFLOW_CMD}\"",
+        "  python orchestration_runner.py \"Fetch emails and identify orders\"",
+        "  python orchestration_runner.py \"Check for new orders and post to Business Central\"",
+        "\nIf no input is provided, the default is to run the complete workflow."
+    )))
+
+async def run_deterministic_workflow() -> None:
+    """Run the email, order and Business Central agents in a fixed order, then summarize the results."""
+    print_banner("RUNNING DETERMINISTIC WORKFLOW")
+    
+    # Import the agents used by the workflow
+    from email_agent import email_agent
+    from order_agent import order_agent
+    from bc_agent import bc_agent
+    from summary_agent import summary_agent
     
-    with trace(workflow_name="Explicit Orchestration") as current_trace:
+    with custom_span(name="Deterministic Workflow"):
+        speculative_task = None
+        email_task = None
+        order_task = None
+        bc_task = None
         try:
-            # Step 1: Start with the orchestration agent
-            print("\n--- Step 1: Orchestration Agent - Initial Instructions ---")
-            orchestration_result = await Runner.run(
-                orchestration_agent, 
-                input="Run the complete workflow"
-            )
-            print(f"\nOrchestration Agent Initial Response:\n{orchestration_result.final_output}")
+            # Speculatively identify orders from the previous run's emails while new emails are fetched.
+            # The result is only used if the fetch returns exactly the same emails. The tools run in
+            # worker threads, so the speculative identification and the fetch actually overlap.
+            snapshot = await asyncio.to_thread(snapshot_emails_dir)
+            if snapshot:
+                speculative_task = asyncio.create_task(run_cached(
+                    order_agent, 
+                    input=f"{ORDER_IDENTIFY_CMD} using emails_dir_path='{SPECULATIVE_EMAILS_DIR}'"
+                ))
             
-            # Step 2: Run the email agent
-            print("\n--- Step 2: Email Agent - Fetch Emails ---")
-            email_result = await Runner.run(
+            # Step 1: Run the email agent
+            print("\n--- Step 1: Email Agent - Fetch Emails ---")
+            email_task = await start_step(
                 email_agent, 
-                input="Fetch all emails from my inbox using credentials_path='credentials.json'"
+                EMAIL_FETCH_CMD
             )
+            
+            # Step 2: Run the order identification agent, unless the speculative run can be reused.
+            # The order agent starts while the email agent is still writing its summary.
+            print("\n--- Step 2: Order Identification Agent - Identify Orders ---")
+            order_result = None
+            if speculative_task:
+                fetched = await asyncio.to_thread(fingerprint_email_folders, EMAILS_DIR)
+                if fetched.keys() == snapshot.keys():
+                    # A failed speculative run only means the orders are identified again
+                    speculative_result = (await asyncio.gather(speculative_task, return_exceptions=True))[0]
+                    if not isinstance(speculative_result, BaseException) and await asyncio.to_thread(
+                        adopt_speculative_orders, snapshot, fetched
+                    ):
+                        print("\nNo new emails - using the speculative order identification.")
+                        order_result = speculative_result
+                    else:
+                        print("\nSpeculative order identification incomplete - identifying orders again.")
+                else:
+                    print("\nNew emails fetched - discarding the speculative order identification.")
+                    await stop_speculation(speculative_task)
+            if order_result is None:
+                order_task = await start_step(
+                    order_agent, 
+                    ORDER_IDENTIFY_CMD
+                )
+            
+            email_result = await email_task
             print(f"\nEmail Agent Result:\n{email_result.final_output}")
+            acknowledge(email_agent, email_result)
             
-            # Step 3: Return to orchestration agent with email results
-            print("\n--- Step 3: Orchestration Agent - Process Email Results ---")
-            orchestration_email_result = await Runner.run(
-                orchestration_agent, 
-                input=f"The Email Agent has completed its task with the following result: {email_result.final_output}"
+            # Step 3: Run the Business Central agent while the order agent finishes its summary
+            print("\n--- Step 3: Business Central Agent - Post Orders ---")
+            bc_task = await start_step(
+                bc_agent, 
+                BC_POST_CMD
             )
-            print(f"\nOrchestration Agent Response:\n{orchestration_email_result.final_output}")
             
-            # Step 4: Run the order identification agent
-            print("\n--- Step 4: Order Identification Agent - Identify Orders ---")
-            order_result = await Runner.run(
-                order_agent, 
-                input="Identify orders from all emails in the emails directory"
-            )
+            if order_task:
+                order_result = await order_task
             print(f"\nOrder Identification Agent Result:\n{order_result.final_output}")
+            acknowledge(order_agent, order_result)
             
-            # Step 5: Return to orchestration agent with order results
-            print("\n--- Step 5: Orchestration Agent - Process Order Results ---")
-            orchestration_order_result = await Runner.run(
-                orchestration_agent, 
-                input=f"The Order Identification Agent has completed its task with the following result: {order_result.final_output}"
-            )
-            print(f"\nOrchestration Agent Response:\n{orchestration_order_result.final_output}")
-            
-            # Step 6: Run the Business Central agent
-            print("\n--- Step 6: Business Central Agent - Post Orders ---")
-            bc_result = await Runner.run(
-                bc_agent, 
-                input="Post all identified orders to Business Central"
-            )
+            bc_result = await bc_task
             print(f"\nBusiness Central Agent Result:\n{bc_result.final_output}")
+            acknowledge(bc_agent, bc_result)
             
-            # Step 7: Return to orchestration agent with BC results
-            print("\n--- Step 7: Orchestration Agent - Final Summary ---")
-            final_result = await Runner.run(
-                orchestration_agent, 
-                input=f"The Business Central Agent has completed its task with the following result: {bc_result.final_output}"
+            # Step 4: Summarize all results in a single prompt
+            print("\n--- Step 4: Summary Agent - Final Summary ---")
+            final_result = await run_cached(
+                summary_agent, 
+                input=(
+                    f"Email Agent result: {email_result.final_output}\n\n"
+                    f"Order Identification Agent result: {order_result.final_output}\n\n"
+                    f"Business Central Agent result: {bc_result.final_output}"
+                )
             )
             
             # Print the final result
-            print("\n================================================================================")
-            print("ORCHESTRATION COMPLETED")
-            print("================================================================================")
-            print("\nFinal Result:")
-            print(final_result.final_output)
+            print_banner("WORKFLOW COMPLETED", "\nFinal Result:", final_result.final_output)
             
         except Exception as e:
-            print("\n================================================================================")
-            print("ORCHESTRATION ERROR")
-            print("================================================================================")
-            print(f"\nError: {str(e)}")
-            print("\nPlease check your network connection and try again.")
+            print_banner(
+                "WORKFLOW ERROR",
+                f"\nError: {str(e)}",
+                "\nPlease check your network connection and try again."
+            )
+        
+        finally:
+            # Stop steps still running after an error, so no agent keeps calling tools (e.g. posting orders),
+            # and retrieve the results of those that already failed
+            step_tasks = [task for task in (email_task, order_task, bc_task) if task]
+            for task in step_tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*step_tasks, return_exceptions=True)
+            
+            # Never leave the speculative run or its snapshot behind, whether the workflow succeeded or not
+            if speculative_task:
+                await stop_speculation(speculative_task)
+            shutil.rmtree(SPECULATIVE_EMAILS_DIR, ignore_errors=True)
 
 async def run_specific_task(input_text: str) -> None:
     """Run a specific task using the appropriate agent."""
-    print("\n================================================================================")
-    print("RUNNING SPECIFIC TASK")
-    print("================================================================================")
-    print(f"Input: {input_text}")
-    print("--------------------------------------------------------------------------------")
+    print_banner("RUNNING SPECIFIC TASK", f"Input: {input_text}", "-" * 80)
     
-    with trace(workflow_name="Specific Task") as current_trace:
+    with custom_span(name="Specific Task"):
         try:
             # Determine which agent to use based on the input
-            if "fetch email" in input_text.lower() or "check email" in input_text.lower():
-                print("\nUsing Email Agent for this task...")
-                result = await Runner.run(email_agent, input=input_text)
-            elif "identify order" in input_text.lower() or "find order" in input_text.lower():
-                print("\nUsing Order Identification Agent for this task...")
-                result = await Runner.run(order_agent, input=input_text)
-            elif "post order" in input_text.lower() or "business central" in input_text.lower():
-                print("\nUsing Business Central Agent for this task...")
-                result = await Runner.run(bc_agent, input=input_text)
-            else:
-                print("\nUsing Orchestration Agent for this task...")
-                result = await Runner.run(orchestration_agent, input=input_text)
+            module_name, agent_label = next(
+                ((module_name, label) for pattern, module_name, label in ROUTE_TABLE if pattern.search(input_text)),
+                ("orchestration_agent", "Orchestration Agent")
+            )
+            print(f"\nUsing {agent_label} for this task...")
+            result = await run_cached(load_agent(module_name), input=input_text)
             
             # Print the final result
-            print("\n================================================================================")
-            print("TASK COMPLETED")
-            print("================================================================================")
-            print("\nResult:")
-            print(result.final_output)
+            print_banner("TASK COMPLETED", "\nResult:", result.final_output)
             
         except Exception as e:
-            print("\n================================================================================")
-            print("TASK ERROR")
-            print("================================================================================")
-            print(f"\nError: {str(e)}")
-            print("\nPlease check your network connection and try again.")
+            print_banner(
+                "TASK ERROR",
+                f"\nError: {str(e)}",
+                "\nPlease check your network connection and try again."
+            )
 
 async def main(input_text: str) -> None:
     """Main function to determine which mode to run."""
-    if input_text.lower() == "run the complete workflow":
-        # Run the workflow with explicit handoffs
-        await run_explicit_workflow()
-    else:
-        # Run a specific task
-        await run_specific_task(input_text)
+    # Share one pooled OpenAI client across all agent runs
+    use_shared_client()
+    
+    # Open a single trace for the process; each workflow or task is recorded as a span within it
+    with trace(workflow_name="Orchestration Runner"):
+        if input_text.lower() == RUN_WORKFLOW_CMD.lower():
+            # Run the deterministic workflow
+            await run_deterministic_workflow()
+        else:
+            # Run a specific task
+            await run_specific_task(input_text)
 
 if __name__ == "__main__":
     # Get the input text from command line arguments
@@ -156,7 +313,7 @@ if __name__ == "__main__":
         input_text = " ".join(sys.argv[1:])
     else:
         # Default input
-        input_text = "Run the complete workflow"
+        input_text = RUN_WORKFLOW_CMD
     
     try:
         # Run the main function
@@ -166,9 +323,6 @@ if __name__ == "__main__":
         sys.exit(1)
     except Exception as e:
         # Print the error message with clear formatting
-        print("\n================================================================================")
-        print("RUNNER ERROR")
-        print("================================================================================")
-        print(f"\nError: {str(e)}")
+        print_banner("RUNNER ERROR", f"\nError: {str(e)}")
         print_usage()
         sys.exit(1) 
\ No newline at end of file
@@ -6,11 +6,12 @@ An agent that can identify sales orders from emails and their attachments using
 
 from agents import Agent
 from tools import identify_orders_from_all_emails
+from prompts import build_instructions
 
 # Create an order identification agent with batch processing tool
 order_agent = Agent(
     name="Order Identification Assistant",
-    instructions="""You are a helpful assistant that can identify sales orders from emails and their attachments.
+    instructions=build_instructions("""You are a helpful assistant that can identify sales orders from emails and their attachments.
 
     When asked to process all emails in a directory:
     - Use the identify_orders_from_all_emails tool to analyze all email folders
@@ -20,18 +21,8 @@ order_agent = Agent(
 
     You can help users understand the order identification process and explain how the system works.
 
-    CRITICAL FOR HANDOFFS: When you're called as part of an orchestration workflow:
-    1. Complete your task (identifying orders) without deviation
-    2. Provide ONLY a clear, concise summary of what you found (e.g., "I identified 3 orders from the emails")
-    3. DO NOT ask follow-up questions like "Shall I proceed?" or "What would you like to do next?"
-    4. DO NOT offer additional services or suggestions
-    5. DO NOT ask for further instructions
-    6. Simply complete your task and return control to the orchestration agent
-    7. End your response with "Task completed." to signal you're done
-
-    Remember: In an orchestration workflow, your ONLY job is to identify orders and report the results.
-    The orchestration agent will decide what to do next.
-    """,
+    In an orchestration workflow, your summary should read like "I identified 3 orders from the emails".
+    """),
     # Using only the batch processing tool since it's what's used in the orchestration workflow
     tools=[identify_orders_from_all_emails],
     handoffs=[],  # Empty handoffs list as this agent doesn't delegate to other agents
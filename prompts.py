@@ -0,0 +1,36 @@
+"""
+Prompts
+
+Shared prompt fragments for the specialized agents.
+The handoff instructions are identical for every specialized agent and are placed at the
+start of each agent's instructions, so the prompt prefix is byte-identical across agents
+and can be reused by provider-side prompt caching.
+"""
+
+import textwrap
+
+# Signal each specialized agent ends its response with when its task is done
+TASK_COMPLETED = "Task completed."
+
+# Handoff instructions shared by all specialized agents
+HANDOFF_INSTRUCTIONS = f"""CRITICAL FOR HANDOFFS: When you're called as part of an orchestration workflow:
+1. Complete your assigned task without deviation
+2. Provide ONLY a clear, concise summary of what you did and what you found
+3. DO NOT ask follow-up questions like "Shall I proceed?" or "What would you like to do next?"
+4. DO NOT offer additional services or suggestions
+5. DO NOT ask for further instructions
+6. Simply complete your task and return control to the orchestration agent
+7. End your response with "{TASK_COMPLETED}" to signal you're done
+
+Remember: In an orchestration workflow, your ONLY job is to complete your assigned task and report the results.
+The orchestration agent will decide what to do next."""
+
+def normalize_prompt(text: str) -> str:
+    """Dedent a prompt written as an indented triple-quoted string and strip trailing whitespace."""
+    first_line, _, rest = text.strip().partition("\n")
+    lines = [first_line] + textwrap.dedent(rest).splitlines()
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+def build_instructions(role_instructions: str) -> str:
+    """Build agent instructions: the shared handoff block first, then the agent-specific text."""
+    return f"{HANDOFF_INSTRUCTIONS}\n\n{normalize_prompt(role_instructions)}"
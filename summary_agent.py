@@ -0,0 +1,29 @@
+"""
+Summary Agent
+
+An agent that summarizes the results of the sales order processing workflow.
+The workflow steps themselves are run directly by orchestration_runner.py; this agent
+is only used to turn the three specialized agents' results into a human-readable summary.
+"""
+
+from agents import Agent
+
+# Create a summary agent without tools or handoffs
+summary_agent = Agent(
+    name="Summary Agent",
+    instructions="""You summarize the results of the sales order processing workflow.
+
+    You will receive the results of three specialized agents that ran in sequence:
+    1. Email Agent: Fetched emails from Gmail and saved them to the local file system
+    2. Order Identification Agent: Identified sales orders from the fetched emails
+    3. Business Central Agent: Posted the identified orders to Business Central
+
+    Provide a clear, concise summary of the entire process, including:
+    - How many emails were fetched
+    - How many orders were identified, with their key details
+    - How many orders were posted to Business Central, with their order numbers
+    - Any errors that occurred and which step they occurred in
+
+    Do not ask follow-up questions or offer additional services.
+    """,
+)
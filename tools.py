@@ -5,7 +5,12 @@ This file contains tool implementations that can be used by agents.
 """
 
 import os
-import pickle
+import asyncio
+import hashlib
+import mmap
+import re
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -17,6 +22,7 @@ import json
 import logging
 import shutil
 from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, field
 from agents import function_tool
 from openai import OpenAI
 import urllib.parse
@@ -24,20 +30,120 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import time
-from datetime import timedelta
+import uuid
+import threading
+from datetime import date, timedelta
 import glob
 
+# orjson is optional; fall back to the standard library json module when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# pybase64 is optional; it is a faster drop-in replacement for the base64 functions used on attachments and images
+try:
+    import pybase64 as fast_base64
+except ImportError:
+    fast_base64 = base64
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+def runs_in_thread(func):
+    """Turn a blocking tool function into an async one that runs in a worker thread.
+    
+    The Agent SDK calls sync function tools on the event loop thread, which would stop agents
+    running concurrently (e.g. speculative order identification during the email fetch) from overlapping.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return wrapper
+
 @function_tool
 def get_weather(city: str) -> str:
     """Get the current weather for a city."""
     return f"The weather in {city} is sunny."
 
+# Maximum number of requests per Gmail batch request (Gmail allows 100, but recommends 50 to avoid rate limiting)
+GMAIL_BATCH_SIZE = 50
+
+# Gmail REST endpoint and number of parallel workers used for attachment downloads
+GMAIL_API_URL = 'https://gmail.googleapis.com/gmail/v1/users/me'
+ATTACHMENT_DOWNLOAD_WORKERS = 8
+
+# Number of emails sent to OpenAI for order identification in parallel, and the model used
+ORDER_IDENTIFICATION_WORKERS = 8
+ORDER_IDENTIFICATION_MODEL = "gpt-4o"
+
+# Number of orders posted to Business Central in parallel (must not exceed the BC session's connection pool size)
+ORDER_POSTING_WORKERS = 8
+
+# Number of base64 characters decoded at a time when writing attachments (must be a multiple of 4)
+BASE64_CHUNK_SIZE = 64 * 1024
+
+# Base URL where the product_pictures directory is hosted; when empty, catalog images are base64-embedded
+PRODUCT_PICTURES_BASE_URL = os.getenv('PRODUCT_PICTURES_BASE_URL', '')
+
+# Attachments larger than this (in bytes) are not downloaded
+MAX_ATTACHMENT_SIZE = int(os.getenv('GMAIL_MAX_ATTACHMENT_SIZE', 25 * 1024 * 1024))
+
+# Images smaller than this (in bytes) are treated as signature logos and icons and are not downloaded
+MIN_IMAGE_ATTACHMENT_SIZE = 4 * 1024
+
+def _json_loads(data):
+    """Parse JSON from a str or bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_dumps_indented(obj):
+    """Serialize obj to an indented JSON string (used for logging), using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj, indent=2)
+
+def _load_json_file(file_path):
+    """Load a JSON file, using orjson when available."""
+    with open(file_path, 'rb') as f:
+        return _json_loads(f.read())
+
+def _dump_json_file(obj, file_path):
+    """Write obj to a JSON file with 2-space indentation, using orjson when available.
+    
+    The JSON is serialized up front, written in one call to a temporary file and then moved into place,
+    so readers never see a partially written file.
+    """
+    if orjson is not None:
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    else:
+        data = json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    # Unique temporary name, so concurrent writers of the same file do not clobber each other's temporary file
+    tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, file_path)
+
+def _write_base64_chunked(data, file_path):
+    """Decode URL-safe base64 data to a file in chunks, so the decoded bytes are never held in memory at once."""
+    with open(file_path, 'wb') as f:
+        for start in range(0, len(data), BASE64_CHUNK_SIZE):
+            chunk = data[start:start + BASE64_CHUNK_SIZE]
+            # Gmail may omit padding, which only affects the last chunk
+            f.write(fast_base64.urlsafe_b64decode(chunk + '=' * (-len(chunk) % 4)))
+
+def _remove_old_email_dirs(root_dir):
+    """Delete email directories moved aside by earlier fetches, including any left over by a previous process."""
+    for old_emails_dir in Path(root_dir).glob('.emails_old_*'):
+        shutil.rmtree(old_emails_dir, ignore_errors=True)
+
+# Serializes access to token.json across the per-thread Gmail services
+_GMAIL_TOKEN_LOCK = threading.Lock()
+
 # Gmail Service for Email Tool
 class GmailService:
     def __init__(self, credentials_file='credentials.json'):
@@ -45,45 +151,68 @@ class GmailService:
         self.creds = None
         self.service = None
         self.SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
+        # Plain HTTP session for attachment downloads (the discovery client is not thread-safe)
+        self.http_session = requests.Session()
         # Get root directory for token storage
         self.root_dir = Path(credentials_file).parent
 
     def authenticate(self):
         """Authenticates with Gmail API using OAuth2."""
-        token_path = self.root_dir / 'token.pickle'
+        # Reuse the existing client while its credentials are still valid
+        if self.service and self.creds and self.creds.valid:
+            return True
         
-        if token_path.exists():
-            with open(token_path, 'rb') as token:
-                self.creds = pickle.load(token)
-
-        if not self.creds or not self.creds.valid:
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                self.creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    self.credentials_file, self.SCOPES)
-                self.creds = flow.run_local_server(port=0)
+        token_path = self.root_dir / 'token.json'
+        
+        # Services in other threads share token.json, so only one of them reads, refreshes or writes it at a time
+        with _GMAIL_TOKEN_LOCK:
+            if token_path.exists():
+                self.creds = Credentials.from_authorized_user_file(str(token_path), self.SCOPES)
+
+            if not self.creds or not self.creds.valid:
+                if self.creds and self.creds.expired and self.creds.refresh_token:
+                    self.creds.refresh(Request())
+                else:
+                    flow = InstalledAppFlow.from_client_secrets_file(
+                        self.credentials_file, self.SCOPES)
+                    self.creds = flow.run_local_server(port=0)
 
-            with open(token_path, 'wb') as token:
-                pickle.dump(self.creds, token)
+                with open(token_path, 'w', encoding='utf-8') as token:
+                    token.write(self.creds.to_json())
 
         self.service = build('gmail', 'v1', credentials=self.creds)
         return True
 
     def get_message_content(self, payload):
-        """Extract message content from payload recursively."""
-        if 'body' in payload and payload['body'].get('data'):
-            return base64.urlsafe_b64decode(payload['body']['data']).decode()
-        
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    if 'data' in part['body']:
-                        return base64.urlsafe_b64decode(part['body']['data']).decode()
-                elif part['mimeType'] == 'multipart/alternative':
-                    return self.get_message_content(part)
+        """Extract message content from payload, walking nested parts without recursion."""
+        data = payload.get('body', {}).get('data')
+        if data:
+            return fast_base64.urlsafe_b64decode(data).decode()
+        
+        # Depth-first walk in document order, stopping at the first text/plain body
+        stack = list(reversed(payload.get('parts', ())))
+        while stack:
+            part = stack.pop()
+            mime_type = part.get('mimeType', '')
+            if mime_type == 'text/plain':
+                data = part.get('body', {}).get('data')
+                if data:
+                    return fast_base64.urlsafe_b64decode(data).decode()
+            elif mime_type.startswith('multipart/'):
+                stack.extend(reversed(part.get('parts', ())))
         return ""
 
+    def skip_attachment(self, part):
+        """Return True if an attachment part should not be downloaded, based on its size and MIME type."""
+        size = part.get('body', {}).get('size', 0)
+        if size > MAX_ATTACHMENT_SIZE:
+            logging.info(f"Skipping attachment {part['filename']}: {size} bytes exceeds the {MAX_ATTACHMENT_SIZE} byte limit")
+            return True
+        if part.get('mimeType', '').startswith('image/') and size < MIN_IMAGE_ATTACHMENT_SIZE:
+            logging.info(f"Skipping small image attachment {part['filename']} ({size} bytes)")
+            return True
+        return False
+
     def save_attachment(self, message_id, part, email_folder):
         """Saves email attachments."""
         if 'filename' not in part:
@@ -94,16 +223,49 @@ class GmailService:
             return None
 
         attachment_path = email_folder / 'attachments' / filename
-        attachment = self.service.users().messages().attachments().get(
-            userId='me', messageId=message_id, id=part['body']['attachmentId']
-        ).execute()
 
-        file_data = base64.urlsafe_b64decode(attachment['data'])
-        with open(attachment_path, 'wb') as f:
-            f.write(file_data)
+        # Small parts are returned inline with the message, so no extra request is needed
+        inline_data = part['body'].get('data')
+        if inline_data:
+            _write_base64_chunked(inline_data, attachment_path)
+            return attachment_path
+
+        response = self.http_session.get(
+            f"{GMAIL_API_URL}/messages/{message_id}/attachments/{part['body']['attachmentId']}",
+            headers={'Authorization': f'Bearer {self.creds.token}'},
+            timeout=60
+        )
+        response.raise_for_status()
+        attachment = response.json()
+
+        _write_base64_chunked(attachment['data'], attachment_path)
 
         return attachment_path
 
+    def get_messages(self, message_ids, format='full'):
+        """Get full message details for the given IDs using batched requests, preserving order."""
+        responses = {}
+        errors = []
+
+        def collect(request_id, response, exception):
+            if exception is not None:
+                errors.append(exception)
+            else:
+                responses[request_id] = response
+
+        for start in range(0, len(message_ids), GMAIL_BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=collect)
+            for message_id in message_ids[start:start + GMAIL_BATCH_SIZE]:
+                batch.add(
+                    self.service.users().messages().get(userId='me', id=message_id, format=format),
+                    request_id=message_id
+                )
+            batch.execute()
+
+        if errors:
+            raise errors[0]
+        return [responses[message_id] for message_id in message_ids]
+
     def fetch_inbox_emails(self, max_results=10):
         """Fetch emails from the inbox."""
         try:
@@ -124,31 +286,34 @@ class GmailService:
             # Create emails directory if it doesn't exist
             emails_dir = Path(self.root_dir) / 'emails'
             if emails_dir.exists():
-                shutil.rmtree(emails_dir)
+                # Move the previous emails out of the way and delete them in the background
+                old_emails_dir = emails_dir.with_name(f'.emails_old_{uuid.uuid4().hex}')
+                os.rename(emails_dir, old_emails_dir)
+                threading.Thread(target=_remove_old_email_dirs, args=(emails_dir.parent,), daemon=True).start()
             emails_dir.mkdir(exist_ok=True)
             
             processed_messages = []
+            saved_emails = []
+            pending_attachments = []
+            
+            # Get the full message details for all messages in batched requests
+            full_messages = self.get_messages([message['id'] for message in messages])
             
             # Process each message
-            for message in messages:
-                # Get the full message details
-                msg = self.service.users().messages().get(
-                    userId='me', 
-                    id=message['id'],
-                    format='full'
-                ).execute()
-                
+            for message, msg in zip(messages, full_messages):
                 # Create email folder
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                email_folder = emails_dir / f'email_{timestamp}'
+                email_folder = emails_dir / f"email_{message['id']}"
                 email_folder.mkdir(parents=True, exist_ok=True)
                 (email_folder / 'attachments').mkdir(exist_ok=True)
 
                 # Process email content
-                headers = msg['payload']['headers']
-                subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
-                sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown Sender')
-                date = next((h['value'] for h in headers if h['name'].lower() == 'date'), '')
+                # Keep the first occurrence of repeated headers, like the original linear lookup did
+                headers = {}
+                for h in msg['payload']['headers']:
+                    headers.setdefault(h['name'].lower(), h['value'])
+                subject = headers.get('subject', 'No Subject')
+                sender = headers.get('from', 'Unknown Sender')
+                date = headers.get('date', '')
 
                 # Extract content
                 content = self.get_message_content(msg['payload'])
@@ -162,44 +327,48 @@ class GmailService:
                     'attachments': []
                 }
 
-                # Process attachments
-                def process_parts(payload):
-                    if 'parts' in payload:
-                        for part in payload['parts']:
-                            if 'filename' in part and part['filename']:
-                                attachment_path = self.save_attachment(
-                                    message['id'], part, email_folder)
-                                if attachment_path:
-                                    email_data['attachments'].append(str(attachment_path))
-                            if 'parts' in part:
-                                process_parts(part)
-                    elif 'filename' in payload and payload['filename']:
-                        attachment_path = self.save_attachment(
-                            message['id'], payload, email_folder)
+                # Collect attachments to download (no I/O here), walking parts in document order
+                payload = msg['payload']
+                stack = list(reversed(payload.get('parts', ()))) or [payload]
+                while stack:
+                    part = stack.pop()
+                    if part.get('filename') and not self.skip_attachment(part):
+                        pending_attachments.append((message['id'], part, email_folder, email_data))
+                    stack.extend(reversed(part.get('parts', ())))
+
+                saved_emails.append((email_folder, email_data))
+
+                # Mark as read (optional)
+                # self.service.users().messages().modify(
+                #     userId='me',
+                #     id=message['id'],
+                #     body={'removeLabelIds': ['UNREAD']}
+                # ).execute()
+
+            # Download all attachments in parallel, keeping their original order per email
+            if pending_attachments:
+                with ThreadPoolExecutor(max_workers=ATTACHMENT_DOWNLOAD_WORKERS) as executor:
+                    futures = [
+                        executor.submit(self.save_attachment, message_id, part, email_folder)
+                        for message_id, part, email_folder, _ in pending_attachments
+                    ]
+                    for (_, _, _, email_data), future in zip(pending_attachments, futures):
+                        attachment_path = future.result()
                         if attachment_path:
                             email_data['attachments'].append(str(attachment_path))
 
-                process_parts(msg['payload'])
-
+            for email_folder, email_data in saved_emails:
                 # Save content to file
-                content_file = email_folder / 'content.txt'
-                with open(content_file, 'w', encoding='utf-8') as f:
-                    json.dump(email_data, f, indent=2, ensure_ascii=False)
+                _dump_json_file(email_data, email_folder / 'content.txt')
 
+                content = email_data['content']
                 processed_messages.append({
-                    'subject': subject,
-                    'sender': sender,
+                    'subject': email_data['subject'],
+                    'sender': email_data['from'],
                     'saved_path': str(email_folder),
                     'content_preview': content[:100] + '...' if len(content) > 100 else content
                 })
 
-                # Mark as read (optional)
-                # self.service.users().messages().modify(
-                #     userId='me',
-                #     id=message['id'],
-                #     body={'removeLabelIds': ['UNREAD']}
-                # ).execute()
-
             return processed_messages
 
         except Exception as e:
@@ -209,7 +378,20 @@ class GmailService:
 # Initialize the Gmail service
 gmail_service = GmailService()
 
+# Gmail services used by the tools, one per credentials file and thread: the tools run in worker threads
+# and the googleapiclient/httplib2 client is not thread-safe, so each worker thread authenticates once
+_SERVICE_CACHE = threading.local()
+
+def _get_gmail_service(credentials_path):
+    """Return this thread's GmailService for a credentials file, creating it on first use."""
+    services: Dict[str, GmailService] = _SERVICE_CACHE.__dict__.setdefault("services", {})
+    service = services.get(credentials_path)
+    if service is None:
+        service = services[credentials_path] = GmailService(credentials_file=credentials_path)
+    return service
+
 @function_tool
+@runs_in_thread
 def fetch_gmail_emails(max_results: int, credentials_path: str) -> List[Dict[str, Any]]:
     """
     Fetch emails from Gmail inbox and save them to the emails directory.
@@ -221,8 +403,8 @@ def fetch_gmail_emails(max_results: int, credentials_path: str) -> List[Dict[str
     Returns:
         List of dictionaries containing email information (subject, sender, saved_path, content_preview)
     """
-    # Initialize Gmail service with the specified credentials
-    service = GmailService(credentials_file=credentials_path)
+    # Get the Gmail service for the specified credentials
+    service = _get_gmail_service(credentials_path)
     
     # Authenticate with Gmail
     logging.info("Authenticating with Gmail...")
@@ -243,6 +425,7 @@ def fetch_gmail_emails(max_results: int, credentials_path: str) -> List[Dict[str
     return emails 
 
 @function_tool
+@runs_in_thread
 def send_gmail_email(to: str, subject: str, body: str, credentials_path: str) -> Dict[str, Any]:
     """
     Send an email using Gmail.
@@ -258,8 +441,8 @@ def send_gmail_email(to: str, subject: str, body: str, credentials_path: str) ->
     """
     from email.mime.text import MIMEText
     
-    # Initialize Gmail service with the specified credentials
-    service = GmailService(credentials_file=credentials_path)
+    # Get the Gmail service for the specified credentials
+    service = _get_gmail_service(credentials_path)
     
     # Authenticate with Gmail
     logging.info("Authenticating with Gmail...")
@@ -300,99 +483,230 @@ def send_gmail_email(to: str, subject: str, body: str, credentials_path: str) ->
         } 
 
 # Helper functions for order identification
+def _encode_image_file(image_path, size):
+    """Encode an image file of the given size to base64 string."""
+    # Empty files cannot be memory-mapped
+    if size == 0:
+        return ""
+    # Encode straight from the mapped file instead of reading it into a bytes copy first
+    with open(image_path, "rb") as image_file, mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return fast_base64.b64encode(mapped).decode('ascii')
+
+@functools.lru_cache(maxsize=256)
+def _encode_catalog_image_cached(image_path, mtime, size):
+    """Encode a product catalog image to base64 string, cached per path, modification time and size."""
+    return _encode_image_file(image_path, size)
+
 def _encode_image(image_path):
-    """Encode an image to base64 string."""
+    """Encode an image to base64 string (used for email attachments, which are seen only once)."""
+    try:
+        return _encode_image_file(image_path, os.path.getsize(image_path))
+    except Exception as e:
+        logging.error(f"Error encoding image {image_path}: {str(e)}")
+        return None
+
+def _encode_catalog_image(image_path):
+    """Encode a product catalog image to base64 string, reusing the encoding across emails."""
     try:
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+        stat = os.stat(image_path)
+        return _encode_catalog_image_cached(str(image_path), stat.st_mtime_ns, stat.st_size)
     except Exception as e:
         logging.error(f"Error encoding image {image_path}: {str(e)}")
         return None
 
+def _product_image_url(file_path, file_extension):
+    """Return the URL sent to OpenAI for a product catalog image.
+    
+    If PRODUCT_PICTURES_BASE_URL is set, the catalog is assumed to be hosted there and images are
+    referenced by URL instead of being base64-embedded in every request.
+    """
+    if PRODUCT_PICTURES_BASE_URL:
+        file_name = os.path.basename(file_path)
+        return f"{PRODUCT_PICTURES_BASE_URL.rstrip('/')}/{urllib.parse.quote(file_name)}"
+    
+    base64_image = _encode_catalog_image(file_path)
+    if not base64_image:
+        return None
+    # Use the correct MIME type based on the file extension
+    return f"data:image/{file_extension};base64,{base64_image}"
+
+@dataclass
+class ProductCatalog:
+    """Product catalog images, stored as parallel lists with one entry per image.
+    
+    Keeping the columns separate lets the prompt text be built from item numbers and descriptions
+    without touching the file paths, and the image payloads be built without touching the text.
+    """
+    item_numbers: List[str] = field(default_factory=list)
+    descriptions: List[str] = field(default_factory=list)
+    file_paths: List[str] = field(default_factory=list)
+    extensions: List[str] = field(default_factory=list)  # Extensions without the dot
+    
+    def __len__(self):
+        return len(self.item_numbers)
+    
+    def add(self, item_number, description, file_path, extension):
+        """Add a product image to the catalog."""
+        self.item_numbers.append(item_number)
+        self.descriptions.append(description)
+        self.file_paths.append(file_path)
+        self.extensions.append(extension)
+    
+    def prompt_lines(self):
+        """Return the catalog listing used in the order identification prompt."""
+        return "\n".join(f"- {item_number} - {description}" for item_number, description in zip(self.item_numbers, self.descriptions))
+    
+    def image_urls(self):
+        """Return the image URL for each product (None where the image could not be encoded)."""
+        return [_product_image_url(file_path, extension) for file_path, extension in zip(self.file_paths, self.extensions)]
+    
+    def fingerprint(self):
+        """Return a hash of the catalog (item numbers, descriptions, image files and where they are hosted)."""
+        digest = hashlib.sha256()
+        digest.update(str(PRODUCT_PICTURES_BASE_URL).encode('utf-8'))
+        for item_number, description, file_path in zip(self.item_numbers, self.descriptions, self.file_paths):
+            try:
+                stat = os.stat(file_path)
+                file_version = f"{stat.st_mtime_ns}:{stat.st_size}"
+            except OSError:
+                file_version = "missing"
+            digest.update(f"{item_number}\0{description}\0{os.path.basename(file_path)}\0{file_version}\0".encode('utf-8'))
+        return digest.hexdigest()
+
+# Last product picture scan, reused while the directory is unchanged
+_product_pictures_cache = {"key": None, "pictures": ProductCatalog()}
+
+# Product picture extensions and filename pattern: item number, then the description inside
+# parentheses, e.g. "1996-S (ATLANTA-kovalevy, perus).png" (the closing parenthesis may be missing)
+PRODUCT_PICTURE_EXTENSIONS = ('png', 'jpg', 'jpeg')
+_PRODUCT_PICTURE_NAME_RE = re.compile(r'([^ ]*)[^(]*(?:\(([^)]*))?')
+
 def _get_product_pictures():
-    """Get all product pictures and their details."""
+    """Get all product pictures and their details as a ProductCatalog."""
     product_pictures_dir = Path.cwd() / 'product_pictures'
-    product_pictures = []
+    product_pictures = ProductCatalog()
     
     if product_pictures_dir.exists():
+        cache_key = (str(product_pictures_dir), product_pictures_dir.stat().st_mtime_ns)
+        if _product_pictures_cache["key"] == cache_key:
+            return _product_pictures_cache["pictures"]
+        
         # Look for both PNG and JPG files
-        for pic_file in product_pictures_dir.glob('*.*'):
-            if pic_file.suffix.lower() in ['.png', '.jpg', '.jpeg']:
+        with os.scandir(product_pictures_dir) as entries:
+            for entry in entries:
+                name, _, extension = entry.name.rpartition('.')
+                extension = extension.lower()
+                if not name or extension not in PRODUCT_PICTURE_EXTENSIONS or not entry.is_file():
+                    continue
                 try:
                     # Extract item number and description from filename
-                    # Handle different filename formats
-                    name = pic_file.stem
-                    
-                    # Format: "1996-S (ATLANTA-kovalevy, perus).png"
-                    if '(' in name and ')' in name:
-                        item_number = name.split(' ')[0]
-                        description = name[name.find('(')+1:name.find(')')]
-                    # Format: "1925-W (Jabra speaker - sensitive microphone.jpg" (missing closing parenthesis)
-                    elif '(' in name:
-                        item_number = name.split(' ')[0]
-                        description = name[name.find('(')+1:]
-                    # Other formats
-                    else:
-                        parts = name.split(' ', 1)
-                        item_number = parts[0]
-                        description = parts[1] if len(parts) > 1 else item_number
+                    item_number, description = _PRODUCT_PICTURE_NAME_RE.match(name).groups()
+                    # Other formats: everything after the first space is the description
+                    if description is None:
+                        _, separator, rest = name.partition(' ')
+                        description = rest if separator else item_number
                     
-                    product_pictures.append({
-                        "file_path": str(pic_file),
-                        "item_number": item_number,
-                        "description": description,
-                        "file_extension": pic_file.suffix.lower()[1:]  # Store extension without the dot
-                    })
-                    logging.info(f"Found product image: {item_number} - {description} ({pic_file.name})")
+                    product_pictures.add(item_number, description, entry.path, extension)
+                    logging.info(f"Found product image: {item_number} - {description} ({entry.name})")
                 except Exception as e:
-                    logging.error(f"Error parsing product image filename {pic_file.name}: {str(e)}")
+                    logging.error(f"Error parsing product image filename {entry.name}: {str(e)}")
+        
+        _product_pictures_cache["key"] = cache_key
+        _product_pictures_cache["pictures"] = product_pictures
     
     return product_pictures
 
-def _process_single_email(email_folder_path):
-    """Process a single email folder and identify orders."""
-    try:
-        logging.info(f"Identifying orders from email folder: {email_folder_path}")
-        
-        # Initialize OpenAI client
-        client = OpenAI()
-        model = "gpt-4o"
-        
-        # Get the email folder path
+# Size of the blocks attachments are hashed in, so large attachments are never read into memory at once
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def _hash_file(digest, file_path):
+    """Feed a file's bytes into digest block by block."""
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+def email_folder_hash(email_folder):
+    """Compute a content hash of an email folder (the raw content.txt and attachment files).
+    
+    Folders are named after the Gmail message id, so the same email fetched again hashes the same.
+    """
+    email_folder = Path(email_folder)
+    digest = hashlib.sha256()
+    content_file = email_folder / 'content.txt'
+    if content_file.exists():
+        _hash_file(digest, content_file)
+    attachments_dir = email_folder / 'attachments'
+    if attachments_dir.exists():
+        for attachment in sorted(attachments_dir.iterdir()):
+            if attachment.is_file():
+                digest.update(attachment.name.encode('utf-8'))
+                _hash_file(digest, attachment)
+    return digest.hexdigest()
+
+def _order_memo_key(email_folder, product_pictures):
+    """Compute the order memo key of an email folder: its content hash, the catalog, model and prompts."""
+    digest = hashlib.sha256()
+    for part in (
+        email_folder_hash(email_folder), product_pictures.fingerprint(),
+        ORDER_IDENTIFICATION_MODEL, _EMAIL_PROMPT_TMPL, _SYS_PROMPT_TMPL
+    ):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+# Identified orders keyed by order memo key; kept outside emails/, which is moved aside on every fetch.
+# Default delivery dates are relative to today, so memo files are prefixed with the date and only reused
+# on the same day.
+ORDER_MEMO_DIR = Path.cwd() / '.order_memo'
+
+# Day the order memo was last pruned, so earlier days' files are only looked for once a day
+_order_memo_pruned = {"day": None}
+
+def _prune_order_memo(today):
+    """Remove order memo files from earlier days."""
+    if _order_memo_pruned["day"] == today:
+        return
+    for memo_file in ORDER_MEMO_DIR.glob('*.json'):
+        if not memo_file.name.startswith(f"{today}_"):
+            memo_file.unlink(missing_ok=True)
+    _order_memo_pruned["day"] = today
+
+def cached_by_folder_hash(func):
+    """Reuse the identified order for an email folder whose content was already identified today."""
+    @functools.wraps(func)
+    def wrapper(email_folder_path, product_pictures=None):
         email_folder = Path(email_folder_path)
         if not email_folder.exists():
-            logging.error(f"Email folder does not exist: {email_folder}")
-            return {"order_details": None, "confidence_score": 0}
-        
-        # Read email content
-        content_file = email_folder / 'content.txt'
-        if not content_file.exists():
-            logging.error(f"Content file does not exist: {content_file}")
-            return {"order_details": None, "confidence_score": 0}
-            
-        # Read the raw email content
-        with open(content_file, 'r', encoding='utf-8') as f:
-            email_data = json.load(f)
-            raw_content = email_data.get('content', '')
-            logging.info(f"Email content loaded: {len(raw_content)} characters")
-        
-        # Check for attachments in the folder
-        attachments_dir = email_folder / 'attachments'
-        attachments = []
-        if attachments_dir.exists():
-            attachments = [f for f in attachments_dir.iterdir() if f.is_file()]
-            logging.info(f"Found {len(attachments)} attachments: {[att.name for att in attachments]}")
+            return func(email_folder_path, product_pictures)
         
-        # Get product pictures
-        product_pictures = _get_product_pictures()
-        logging.info(f"Found {len(product_pictures)} product pictures")
-        
-        # Calculate default delivery date (current date + 14 days)
-        current_date = datetime.now()
-        default_delivery_date = (current_date + timedelta(days=14)).strftime("%Y-%m-%d")
+        if product_pictures is None:
+            product_pictures = _get_product_pictures()
+        today = datetime.now().strftime("%Y-%m-%d")
+        memo_file = ORDER_MEMO_DIR / f"{today}_{_order_memo_key(email_folder, product_pictures)}.json"
+        if memo_file.exists():
+            try:
+                result = _load_json_file(memo_file)
+                # Downstream steps read identified_order.json from the email folder itself
+                _dump_json_file(result, email_folder / 'identified_order.json')
+                logging.info(f"Email folder unchanged, reusing identified order: {memo_file}")
+                return result
+            except (OSError, ValueError) as e:
+                logging.warning(f"Could not reuse identified order {memo_file}: {str(e)}")
         
-        # Format the email content
-        formatted_email = f"""
+        result = func(email_folder_path, product_pictures)
+        if result is not None and "error" not in result:
+            # The order has been identified either way, so a failure to memoize it is only logged
+            try:
+                ORDER_MEMO_DIR.mkdir(exist_ok=True)
+                _prune_order_memo(today)
+                _dump_json_file(result, memo_file)
+            except (OSError, TypeError, ValueError) as e:
+                logging.warning(f"Could not store identified order {memo_file}: {str(e)}")
+        return result
+    return wrapper
+
+# Order identification prompts; only the email details and dates are filled in per email
+_EMAIL_PROMPT_TMPL = """
 Please analyze this email and any attached images to extract sales order information.
 
 Email Content:
@@ -401,11 +715,11 @@ Email Content:
 
 Attachments Found:
 ----------------
-{chr(10).join('- ' + att.name for att in attachments) if attachments else 'No attachments'}
+{attachment_lines}
 
 Product Catalog Images Available:
 -------------------------------
-{chr(10).join(f"- {pic['item_number']} - {pic['description']}" for pic in product_pictures)}
+{catalog_lines}
 
 IMPORTANT INSTRUCTIONS:
 1. Extract all order details including customer information, dates, and items ordered.
@@ -417,59 +731,13 @@ IMPORTANT INSTRUCTIONS:
 7. If the email mentions a quantity (e.g., "3 pieces"), use that quantity.
 8. If no quantity is specified, default to 1.
 9. DELIVERY DATE MUST BE IN THE FUTURE - if no date is specified or the date is in the past, use current date + 14 days.
-10. Today's date is {current_date.strftime("%Y-%m-%d")} and the default delivery date should be {default_delivery_date}.
+10. Today's date is {today} and the default delivery date should be {default_delivery_date}.
 11. Always explain your reasoning for the delivery date in the data_repair_notes.
 
 Return null if no valid order information can be found.
 """
-        
-        # Prepare message content with both text and images
-        message_content = [
-            {"type": "text", "text": formatted_email}
-        ]
-        
-        # Add email attachments if present
-        attachment_count = 0
-        for attachment in attachments:
-            if attachment.suffix.lower() in ['.jpg', '.jpeg', '.png', '.gif']:
-                base64_image = _encode_image(str(attachment))
-                if base64_image:
-                    message_content.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/{attachment.suffix.lower()[1:]};base64,{base64_image}"
-                        }
-                    })
-                    attachment_count += 1
-                    logging.info(f"Added attachment image: {attachment.name}")
-                else:
-                    logging.error(f"Failed to encode attachment: {attachment.name}")
-        
-        # Add product catalog images
-        product_count = 0
-        for product in product_pictures:
-            base64_image = _encode_image(product["file_path"])
-            if base64_image:
-                # Use the correct MIME type based on the file extension
-                file_ext = product.get("file_extension", "png")
-                message_content.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/{file_ext};base64,{base64_image}"
-                    }
-                })
-                product_count += 1
-                logging.info(f"Added product image: {product['item_number']} - {product['description']}")
-            else:
-                logging.error(f"Failed to encode product image: {product['item_number']}")
-        
-        logging.info(f"Sending request to OpenAI with {len(message_content)} content items ({attachment_count} attachments, {product_count} product images)")
-        
-        # Get order information using GPT-4o with structured output
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": f"""You are an expert at identifying sales orders from emails and images.
+
+_SYS_PROMPT_TMPL = """You are an expert at identifying sales orders from emails and images.
 You must validate and repair order information using the existing master data records.
 
 Valid Customers (Customer Name - Customer Number):
@@ -527,7 +795,7 @@ Data Repair Instructions:
    - When matching images, use the item number and description from the matching product's filename
 
 3. Dates:
-   - Today's date is {current_date.strftime("%Y-%m-%d")}
+   - Today's date is {today}
    - The default delivery date (today + 14 days) is {default_delivery_date}
    - Ensure all dates are in YYYY-MM-DD format
    - IMPORTANT: The requested delivery date must ALWAYS be in the future
@@ -574,20 +842,120 @@ Structure:
     "confidence_score": number  // Confidence level in the order identification and repair (0-1)
 }}
 
-If no valid order information can be found, or if the data cannot be repaired to match the master data, return {{"order_details": null, "confidence_score": 0}}"""},
+If no valid order information can be found, or if the data cannot be repaired to match the master data, return {{"order_details": null, "confidence_score": 0}}"""
+
+@cached_by_folder_hash
+def _process_single_email(email_folder_path, product_pictures=None):
+    """Process a single email folder and identify orders.
+    
+    product_pictures can be passed in when processing several emails, so the catalog is only loaded once.
+    """
+    try:
+        logging.info(f"Identifying orders from email folder: {email_folder_path}")
+        
+        # Initialize OpenAI client
+        client = OpenAI()
+        
+        # Get the email folder path
+        email_folder = Path(email_folder_path)
+        if not email_folder.exists():
+            logging.error(f"Email folder does not exist: {email_folder}")
+            return {"order_details": None, "confidence_score": 0}
+        
+        # Read email content
+        content_file = email_folder / 'content.txt'
+        if not content_file.exists():
+            logging.error(f"Content file does not exist: {content_file}")
+            return {"order_details": None, "confidence_score": 0}
+            
+        # Read the raw email content
+        email_data = _load_json_file(content_file)
+        raw_content = email_data.get('content', '')
+        logging.info(f"Email content loaded: {len(raw_content)} characters")
+        
+        # Check for attachments in the folder
+        attachments_dir = email_folder / 'attachments'
+        attachments = []
+        if attachments_dir.exists():
+            attachments = [f for f in attachments_dir.iterdir() if f.is_file()]
+            logging.info(f"Found {len(attachments)} attachments: {[att.name for att in attachments]}")
+        
+        # Get product pictures
+        if product_pictures is None:
+            product_pictures = _get_product_pictures()
+        logging.info(f"Found {len(product_pictures)} product pictures")
+        
+        # Calculate default delivery date (current date + 14 days)
+        current_date = datetime.now()
+        default_delivery_date = (current_date + timedelta(days=14)).strftime("%Y-%m-%d")
+        today = current_date.strftime("%Y-%m-%d")
+        
+        # Format the email content
+        formatted_email = _EMAIL_PROMPT_TMPL.format(
+            raw_content=raw_content,
+            attachment_lines="\n".join('- ' + att.name for att in attachments) if attachments else 'No attachments',
+            catalog_lines=product_pictures.prompt_lines(),
+            today=today,
+            default_delivery_date=default_delivery_date
+        )
+        
+        # Prepare message content with both text and images
+        message_content = [
+            {"type": "text", "text": formatted_email}
+        ]
+        
+        # Add email attachments if present
+        attachment_count = 0
+        for attachment in attachments:
+            if attachment.suffix.lower() in ['.jpg', '.jpeg', '.png', '.gif']:
+                base64_image = _encode_image(str(attachment))
+                if base64_image:
+                    message_content.append({
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/{attachment.suffix.lower()[1:]};base64,{base64_image}"
+                        }
+                    })
+                    attachment_count += 1
+                    logging.info(f"Added attachment image: {attachment.name}")
+                else:
+                    logging.error(f"Failed to encode attachment: {attachment.name}")
+        
+        # Add product catalog images
+        product_count = 0
+        for item_number, description, image_url in zip(
+            product_pictures.item_numbers, product_pictures.descriptions, product_pictures.image_urls()
+        ):
+            if image_url:
+                message_content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": image_url
+                    }
+                })
+                product_count += 1
+                logging.info(f"Added product image: {item_number} - {description}")
+            else:
+                logging.error(f"Failed to encode product image: {item_number}")
+        
+        logging.info(f"Sending request to OpenAI with {len(message_content)} content items ({attachment_count} attachments, {product_count} product images)")
+        
+        # Get order information using GPT-4o with structured output
+        response = client.chat.completions.create(
+            model=ORDER_IDENTIFICATION_MODEL,
+            messages=[
+                {"role": "system", "content": _SYS_PROMPT_TMPL.format(today=today, default_delivery_date=default_delivery_date)},
                 {"role": "user", "content": message_content}
             ],
             response_format={"type": "json_object"}
         )
         
         # Extract the structured result
-        result = json.loads(response.choices[0].message.content)
-        logging.info(f"Received response from OpenAI: {json.dumps(result, indent=2)}")
+        result = _json_loads(response.choices[0].message.content)
+        logging.info(f"Received response from OpenAI: {_json_dumps_indented(result)}")
         
         # Save the results
-        output_file = email_folder / 'identified_order.json'
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
+        _dump_json_file(result, email_folder / 'identified_order.json')
         
         return result
         
@@ -597,7 +965,45 @@ If no valid order information can be found, or if the data cannot be repaired to
         logging.error(traceback.format_exc())
         return {"order_details": None, "confidence_score": 0, "error": str(e)}
 
+# Email directories whose order identification was cancelled (e.g. a discarded speculative run), and the
+# number of email folders still being identified per directory
+_cancelled_email_dirs = set()
+_active_identifications = {}
+_identification_condition = threading.Condition()
+
+def cancel_order_identification(emails_dir):
+    """Skip every email folder in emails_dir that has not started being identified yet."""
+    with _identification_condition:
+        _cancelled_email_dirs.add(Path(emails_dir).resolve())
+
+def resume_order_identification(emails_dir):
+    """Allow email folders in emails_dir to be identified again after cancel_order_identification."""
+    with _identification_condition:
+        _cancelled_email_dirs.discard(Path(emails_dir).resolve())
+
+def wait_for_order_identification(emails_dir, timeout=None):
+    """Block until no email folder in emails_dir is being identified; returns False on timeout."""
+    emails_dir = Path(emails_dir).resolve()
+    with _identification_condition:
+        return _identification_condition.wait_for(lambda: not _active_identifications.get(emails_dir), timeout)
+
+def _identify_email(email_folder_path, product_pictures=None):
+    """Identify orders in an email folder unless its emails directory was cancelled."""
+    emails_dir = Path(email_folder_path).parent.resolve()
+    with _identification_condition:
+        if emails_dir in _cancelled_email_dirs:
+            logging.info(f"Order identification cancelled, skipping email folder: {email_folder_path}")
+            return {"order_details": None, "confidence_score": 0, "error": "Order identification cancelled"}
+        _active_identifications[emails_dir] = _active_identifications.get(emails_dir, 0) + 1
+    try:
+        return _process_single_email(email_folder_path, product_pictures)
+    finally:
+        with _identification_condition:
+            _active_identifications[emails_dir] -= 1
+            _identification_condition.notify_all()
+
 @function_tool
+@runs_in_thread
 def identify_orders_from_emails(email_folder_path: str, credentials_path: Optional[str] = None) -> Dict[str, Any]:
     """
     Identify sales orders from a SINGLE email folder and its attachments using GPT-4o.
@@ -615,9 +1021,10 @@ def identify_orders_from_emails(email_folder_path: str, credentials_path: Option
         For batch processing of all emails, use identify_orders_from_all_emails instead.
     """
     # Simply call the helper function
-    return _process_single_email(email_folder_path)
+    return _identify_email(email_folder_path)
 
 @function_tool
+@runs_in_thread
 def identify_orders_from_all_emails(emails_dir_path: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Process ALL email folders in the emails directory and identify orders.
@@ -646,13 +1053,23 @@ def identify_orders_from_all_emails(emails_dir_path: Optional[str] = None) -> Li
         
         logging.info(f"Processing emails from directory: {emails_dir}")
         
+        # Load the product catalog once for all emails
+        product_pictures = _get_product_pictures()
+        
+        email_folders = [email_folder for email_folder in emails_dir.iterdir() if email_folder.is_dir()]
+        for email_folder in email_folders:
+            logging.info(f"Processing email folder: {email_folder.name}")
+        
+        # Each email is dominated by the OpenAI round-trip, so process them in parallel
         results = []
-        for email_folder in emails_dir.iterdir():
-            if email_folder.is_dir():
-                logging.info(f"Processing email folder: {email_folder.name}")
-                result = _process_single_email(str(email_folder))
-                if result and result.get('order_details'):
-                    results.append(result)
+        if email_folders:
+            with ThreadPoolExecutor(max_workers=min(ORDER_IDENTIFICATION_WORKERS, len(email_folders))) as executor:
+                for result in executor.map(
+                    lambda email_folder: _identify_email(str(email_folder), product_pictures),
+                    email_folders
+                ):
+                    if result and result.get('order_details'):
+                        results.append(result)
         
         return results
         
@@ -661,9 +1078,135 @@ def identify_orders_from_all_emails(emails_dir_path: Optional[str] = None) -> Li
         return [{"order_details": None, "confidence_score": 0, "error": str(e)}] 
 
 # Business Central integration
+class _ThrottledPostRetry(Retry):
+    """Retry strategy that retries POST requests only when the server throttled them.
+    
+    A POST that failed with a 5xx or timed out may already have created the sales order or line,
+    so it is retried only on 429/503 responses carrying a Retry-After header.
+    """
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method and method.upper() == "POST":
+            return bool(self.total and has_retry_after and status_code in (429, 503))
+        return super().is_retry(method, status_code, has_retry_after)
+
+def _create_bc_session():
+    """Create the HTTP session shared by all Business Central service instances."""
+    # Business Central API: idempotent methods are retried on transient errors, POSTs only when throttled
+    api_retry_strategy = _ThrottledPostRetry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[408, 429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    # Token endpoint: requesting a token has no side effects, so the POST is retried on any transient error
+    login_retry_strategy = Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[408, 429, 500, 502, 503, 504],
+        allowed_methods=frozenset({"POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    session = requests.Session()
+    # Requests keeps connections alive by default; the pool lets them be reused across calls and threads
+    session.mount("https://", HTTPAdapter(
+        max_retries=api_retry_strategy,
+        pool_connections=10,
+        pool_maxsize=20,
+        pool_block=True
+    ))
+    # Longest prefix wins, so token requests use this adapter instead of the one above
+    session.mount("https://login.microsoftonline.com/", HTTPAdapter(max_retries=login_retry_strategy))
+    # Headers common to every request; Content-Type is set by requests for json= bodies, and the
+    # Authorization header is added per request since the session is also used for the token endpoint
+    session.headers.update({"Accept": "application/json"})
+    return session
+
+# Send all lines of an order in one OData $batch request; set BC_BATCH_LINES=0 for tenants without $batch support
+BC_BATCH_LINES = os.getenv('BC_BATCH_LINES', '1').lower() not in ('0', 'false', 'no')
+
+# Order lines posted in parallel when $batch is disabled. The pool is shared by all orders being posted, so
+# ORDER_POSTING_WORKERS + ORDER_LINE_WORKERS requests at most are in flight, within the session's pool_maxsize
+# of 20. Order workers only wait on line requests, and line requests wait on nothing, so it cannot deadlock.
+ORDER_LINE_WORKERS = 8
+_ORDER_LINE_EXECUTOR = ThreadPoolExecutor(max_workers=ORDER_LINE_WORKERS, thread_name_prefix="bc-order-lines")
+
+# Response headers included in error logs (the rest are rarely useful for diagnosing a failed request)
+LOGGED_RESPONSE_HEADERS = ('content-type', 'content-length', 'www-authenticate', 'request-id', 'x-request-id', 'ms-correlation-x', 'retry-after')
+
+# Error response bodies larger than this (in bytes) are truncated in the logs instead of being parsed and dumped
+MAX_LOGGED_ERROR_BODY_SIZE = 4 * 1024
+
+def _response_text_for_log(response):
+    """Return the response body as text for logging, truncated to MAX_LOGGED_ERROR_BODY_SIZE bytes."""
+    content = response.content or b''
+    if len(content) <= MAX_LOGGED_ERROR_BODY_SIZE:
+        return response.text
+    text = content[:MAX_LOGGED_ERROR_BODY_SIZE].decode(response.encoding or 'utf-8', errors='replace')
+    return f"{text}... (truncated, {len(content)} bytes in total)"
+
+@functools.lru_cache(maxsize=1024)
+def _load_order_file_cached(order_file_path, mtime, size):
+    """Load an order file, cached per path, modification time and size."""
+    return _load_json_file(order_file_path)
+
+def _load_order_file(order_file_path):
+    """Load an identified order file, reusing the parsed data while the file is unchanged.
+    
+    The returned dict is shared between callers and must not be modified.
+    """
+    stat = os.stat(order_file_path)
+    return _load_order_file_cached(str(order_file_path), stat.st_mtime_ns, stat.st_size)
+
+# Fields that must be present in an order's order_details before it is sent to Business Central
+REQUIRED_ORDER_PATHS = [
+    ("customer_info", "customer_number"),
+    ("customer_info", "name"),
+    ("customer_info", "contact_person"),
+    ("dates", "requested_delivery_date"),
+    ("items",),
+]
+REQUIRED_ITEM_FIELDS = ("item_number", "quantity")
+
+class InvalidOrderError(ValueError):
+    """Raised when an identified order lacks fields needed to create a sales order."""
+
+def _validate_order_details(order_details):
+    """Check that order_details has every field needed to create a sales order, raising InvalidOrderError if not."""
+    for path in REQUIRED_ORDER_PATHS:
+        value = order_details
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                raise InvalidOrderError(f"Missing order field: {'.'.join(path)}")
+            value = value[key]
+    
+    items = order_details["items"]
+    if not isinstance(items, list) or not items:
+        raise InvalidOrderError("Order has no items")
+    for index, item in enumerate(items):
+        for field_name in REQUIRED_ITEM_FIELDS:
+            if not isinstance(item, dict) or field_name not in item:
+                raise InvalidOrderError(f"Missing order field: items[{index}].{field_name}")
+
+# Shared session, so connections to Business Central and Azure AD are reused across service instances
+_BC_SESSION = _create_bc_session()
+
 class BusinessCentralService:
     """Service for interacting with Business Central API."""
     
+    # Constant fields of every sales order header and sales line payload
+    _HEADER_CONSTANTS = {
+        "Document_Type": "Order",
+        "External_Document_No": "APA_FROM_EMAIL",
+        "Status": "Open"
+    }
+    _LINE_CONSTANTS = {
+        "Document_Type": "Order",
+        "Type": "Item",
+        "Location_Code": ""  # Required field but can be empty
+    }
+    
     def __init__(self):
         """Initialize the Business Central service with credentials from environment variables."""
         # Load configuration from environment variables
@@ -676,26 +1219,27 @@ class BusinessCentralService:
             raise ValueError("Missing required Business Central environment variables")
         
         self.access_token = None
+        self._token_expiry = 0.0
+        self._token_lock = threading.Lock()
+        self._cached_headers = None
+        # (date, date string, default due date string) for today, recomputed when the date changes
+        self._today_cache = (None, None, None)
         # Properly encode the company name for the URL
         encoded_company = urllib.parse.quote(self.company_name)
-        self.base_url = f"https://api.businesscentral.dynamics.com/v2.0/{self.tenant_id}/Production/ODataV4/Company('{encoded_company}')"
+        self.company_path = f"Company('{encoded_company}')"
+        # Service root (used for $batch requests) and company URL
+        self.service_root = f"https://api.businesscentral.dynamics.com/v2.0/{self.tenant_id}/Production/ODataV4"
+        self.base_url = f"{self.service_root}/{self.company_path}"
         logging.info(f"Using Business Central base URL: {self.base_url}")
         
-        # Configure retry strategy
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[408, 429, 500, 502, 503, 504],
-        )
-        self.session = requests.Session()
-        self.session.mount("https://", HTTPAdapter(max_retries=retry_strategy))
+        self.session = _BC_SESSION
     
     def get_access_token(self):
-        """Get access token from Azure AD with retry logic."""
-        max_retries = 3
-        retry_delay = 1  # seconds
-        
-        for attempt in range(max_retries):
+        """Get access token from Azure AD, reusing the cached token until it expires."""
+        with self._token_lock:
+            if self.access_token and time.monotonic() < self._token_expiry:
+                return self.access_token
+            
             try:
                 url = f"https://login.microsoftonline.com/{self.tenant_id}/oauth2/v2.0/token"
                 data = {
@@ -705,86 +1249,97 @@ class BusinessCentralService:
                     "scope": "https://api.businesscentral.dynamics.com/.default"
                 }
                 
+                # Transient failures are retried with backoff by the session's retry strategy
                 response = self.session.post(url, data=data)
                 response.raise_for_status()
                 
                 token_data = response.json()
                 self.access_token = token_data["access_token"]
+                self._cached_headers = {"Authorization": f"Bearer {self.access_token}"}
+                # Refresh a minute before the token actually expires
+                self._token_expiry = time.monotonic() + int(token_data.get("expires_in", 3600)) - 60
                 return self.access_token
                 
             except requests.exceptions.RequestException as e:
-                if attempt == max_retries - 1:  # Last attempt
-                    logging.error(f"Failed to get access token after {max_retries} attempts: {str(e)}")
-                    raise
-                else:
-                    logging.warning(f"Attempt {attempt + 1} failed, retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
+                logging.error(f"Failed to get access token: {str(e)}")
+                raise
 
     def get_headers(self):
-        """Get headers for BC API calls."""
-        if not self.access_token:
+        """Get the per-request headers for BC API calls (the session already sends Accept).
+        
+        The headers dict is built once per token and reused until the token is refreshed.
+        """
+        if self._cached_headers is None or time.monotonic() >= self._token_expiry:
             self.get_access_token()
             
-        return {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
+        return self._cached_headers
+
+    def _invalidate_token(self, rejected_authorization):
+        """Drop the cached token after a 401, unless another thread has already replaced the rejected token."""
+        with self._token_lock:
+            if self.access_token and rejected_authorization == f"Bearer {self.access_token}":
+                self.access_token = None
+                self._token_expiry = 0.0
+
+    def _log_error_response(self, response, label):
+        """Log an error response's body as indented JSON, or as (truncated) text if it is not small JSON."""
+        body = None
+        if response.content and len(response.content) <= MAX_LOGGED_ERROR_BODY_SIZE:
+            try:
+                body = response.json()
+            except ValueError:
+                body = None
+        
+        if body is not None:
+            logging.error(f"{label} body: {_json_dumps_indented(body)}")
+        else:
+            logging.error(f"{label} text: {_response_text_for_log(response)}")
 
     def make_request(self, method, url, **kwargs):
-        """Make HTTP request with retry logic and token refresh."""
-        max_retries = 3
-        retry_delay = 1
+        """Make HTTP request with token refresh, adding the authorization header if none is given.
         
-        for attempt in range(max_retries):
-            try:
+        Transient failures are retried with backoff by the session's retry strategy.
+        """
+        if 'headers' not in kwargs:
+            kwargs['headers'] = self.get_headers()
+        
+        try:
+            response = self.session.request(method, url, **kwargs)
+            
+            # If token expired, refresh and retry once
+            if response.status_code == 401:
+                logging.info("Token expired, refreshing...")
+                self._invalidate_token(kwargs['headers'].get("Authorization"))
+                kwargs['headers'] = self.get_headers()
                 response = self.session.request(method, url, **kwargs)
-                
-                # If token expired, refresh and retry
-                if response.status_code == 401:
-                    logging.info("Token expired, refreshing...")
-                    self.access_token = None
-                    kwargs['headers'] = self.get_headers()
-                    continue
-                
-                # Log the complete response for debugging on error
-                if not response.ok:
-                    logging.error(f"Request failed with status {response.status_code}")
-                    logging.error(f"Response headers: {dict(response.headers)}")
-                    try:
-                        error_json = response.json()
-                        logging.error(f"Response body: {json.dumps(error_json, indent=2)}")
-                    except:
-                        logging.error(f"Response text: {response.text}")
-                
-                response.raise_for_status()
-                return response
-                
-            except requests.exceptions.RequestException as e:
-                if attempt == max_retries - 1:
-                    logging.error(f"Request failed after {max_retries} attempts: {str(e)}")
-                    if hasattr(e, 'response'):
-                        try:
-                            error_json = e.response.json()
-                            logging.error(f"Error details: {json.dumps(error_json, indent=2)}")
-                        except:
-                            logging.error(f"Error response text: {e.response.text}")
-                    raise
-                else:
-                    logging.warning(f"Attempt {attempt + 1} failed, retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
+            
+            # Log the complete response for debugging on error
+            if not response.ok:
+                logging.error(f"Request failed with status {response.status_code}")
+                logging.error("Response headers: %s", {
+                    name: response.headers[name] for name in LOGGED_RESPONSE_HEADERS if name in response.headers
+                })
+                self._log_error_response(response, "Response")
+            
+            response.raise_for_status()
+            return response
+            
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Request failed: {str(e)}")
+            raise
 
     def create_sales_order(self, order_data):
         """Create a sales order in Business Central."""
         try:
-            # Get current timestamp for all date fields
-            current_date = datetime.now()
-            current_date_str = current_date.strftime("%Y-%m-%d")
+            # Reject malformed orders before any request is made
+            _validate_order_details(order_data.get("order_details"))
             
-            # Calculate default due date (1 week from now)
-            default_due_date = (current_date + timedelta(days=7)).strftime("%Y-%m-%d")
+            # Get today's date for all date fields and the default due date (1 week from now),
+            # computed once per day rather than per order
+            today = date.today()
+            if self._today_cache[0] != today:
+                self._today_cache = (today, today.isoformat(), (today + timedelta(days=7)).isoformat())
+            _, current_date_str, default_due_date = self._today_cache
             
             # Get the requested delivery date or default to 14 days ahead
             requested_delivery_date = order_data["order_details"]["dates"]["requested_delivery_date"]
@@ -793,34 +1348,32 @@ class BusinessCentralService:
             due_date = order_data["order_details"]["dates"].get("due_date", default_due_date)
             
             # Prepare sales order header with constants and system dates
-            sales_header = {
-                "Document_Type": "Order",
+            sales_header = self._HEADER_CONSTANTS | {
                 "Sell_to_Customer_No": order_data["order_details"]["customer_info"]["customer_number"],
                 "Sell_to_Customer_Name": order_data["order_details"]["customer_info"]["name"],
                 "Sell_to_Contact": order_data["order_details"]["customer_info"]["contact_person"],
-                "External_Document_No": "APA_FROM_EMAIL",  # Fixed constant
                 "Document_Date": current_date_str,
                 "Posting_Date": current_date_str,
                 "VAT_Reporting_Date": current_date_str,
                 "Order_Date": current_date_str,
                 "Due_Date": due_date,
-                "Requested_Delivery_Date": requested_delivery_date,
-                "Status": "Open"
+                "Requested_Delivery_Date": requested_delivery_date
             }
 
-            # Log the request payload for debugging
-            logging.info(f"Creating sales order with data: {json.dumps(sales_header, indent=2)}")
+            # Log the request payload for debugging (only serialized when debug logging is enabled)
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug("Creating sales order with data: %s", _json_dumps_indented(sales_header))
 
             # Create sales order header
             response = self.make_request(
                 'post',
                 f"{self.base_url}/SalesOrder",
-                headers=self.get_headers(),
                 json=sales_header
             )
             
             order = response.json()
-            logging.info(f"Created sales order header: {json.dumps(order, indent=2)}")
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug("Created sales order header: %s", _json_dumps_indented(order))
             
             # Add order lines
             self.add_order_lines(order, order_data["order_details"]["items"])
@@ -838,53 +1391,127 @@ class BusinessCentralService:
             raise
 
     def add_order_lines(self, order, items):
-        """Add order lines to an existing sales order."""
+        """Add order lines to an existing sales order.
+        
+        Lines are sent in a single OData $batch request unless BC_BATCH_LINES is disabled, in which
+        case each line is posted separately over the shared keep-alive session.
+        """
+        if not items:
+            return
+        
+        # Fields shared by every line of the order; only the line-specific fields are filled in per item
+        line_template = self._LINE_CONSTANTS | {'Document_No': order['No']}
+        
+        line_datas = []
         line_no = 10000
         for item in items:
-            line_data = {
-                'Document_Type': 'Order',
-                'Document_No': order['No'],
-                'Line_No': line_no,
-                'Type': 'Item',
-                'No': item['item_number'],
-                'Quantity': float(item['quantity']),
-                'Location_Code': ''  # Required field but can be empty
-            }
+            line_data = line_template.copy()
+            line_data['Line_No'] = line_no
+            line_data['No'] = item['item_number']
+            line_data['Quantity'] = float(item['quantity'])
+            line_datas.append(line_data)
+            line_no += 10000
+        
+        if BC_BATCH_LINES:
+            created_lines = self._post_order_lines_batch(line_datas, items)
+        else:
+            created_lines = self._post_order_lines_individually(line_datas)
+        
+        for line_data, item, created_line in zip(line_datas, items, created_lines):
+            # Log the entire response for debugging (only serialized when debug logging is enabled)
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug("Sales line response: %s", _json_dumps_indented(created_line))
             
-            # Use the correct endpoint for sales order lines
-            url = f"{self.base_url}/SalesOrderSalesLines"
+            # Get the calculated unit price from the response
+            unit_price = created_line.get('Unit_Price', 0)
+            logging.info(f"Created order line {line_data['Line_No']} for item {item['item_number']} with BC-calculated price {unit_price}")
+
+    def _post_order_lines_batch(self, line_datas, items):
+        """Create order lines with one $batch request in a single atomicity group, returning the created lines."""
+        # Use the correct endpoint for sales order lines (relative to the service root)
+        batch_requests = [
+            {
+                "id": str(index),
+                "atomicityGroup": "salesLines",
+                "method": "POST",
+                "url": f"{self.company_path}/SalesOrderSalesLines",
+                "headers": {"Content-Type": "application/json"},
+                "body": line_data
+            }
+            for index, line_data in enumerate(line_datas, start=1)
+        ]
+        
+        try:
+            response = self.make_request('post', f"{self.service_root}/$batch", json={"requests": batch_requests})
+            line_responses = {r.get("id"): r for r in response.json().get("responses", [])}
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error creating order lines: {str(e)}")
+            if hasattr(e.response, 'text'):
+                logging.error(f"Response: {_response_text_for_log(e.response)}")
+            raise
+        
+        created_lines = []
+        for batch_request, item in zip(batch_requests, items):
+            line_response = line_responses.get(batch_request["id"], {})
+            status = line_response.get("status", 0)
+            created_line = line_response.get("body", {})
             
-            try:
-                response = self.make_request('post', url, headers=self.get_headers(), json=line_data)
-                created_line = response.json()
-                
-                # Log the entire response for debugging
-                logging.info(f"Sales line response: {json.dumps(created_line, indent=2)}")
-                
-                # Get the calculated unit price from the response
-                unit_price = created_line.get('Unit_Price', 0)
-                logging.info(f"Created order line {line_no} for item {item['item_number']} with BC-calculated price {unit_price}")
-                line_no += 10000
+            if not 200 <= status < 300:
+                logging.error(f"Error creating order line {batch_request['body']['Line_No']} (status {status}): {_json_dumps_indented(created_line)}")
+                raise requests.exceptions.HTTPError(
+                    f"Creating order line {batch_request['body']['Line_No']} for item {item['item_number']} failed with status {status}",
+                    response=response
+                )
+            created_lines.append(created_line)
+        return created_lines
+
+    def _post_order_line(self, url, line_data):
+        """Create a single order line and return the created line."""
+        try:
+            response = self.make_request('post', url, json=line_data)
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error creating order line: {str(e)}")
+            if hasattr(e.response, 'text'):
+                logging.error(f"Response: {_response_text_for_log(e.response)}")
+            raise
+
+    def _post_order_lines_individually(self, line_datas):
+        """Create order lines with one request per line, for tenants where $batch is not available.
+        
+        Each line has its own Line_No, so the requests are sent in parallel through the shared line pool.
+        """
+        url = f"{self.base_url}/SalesOrderSalesLines"
+        futures = [_ORDER_LINE_EXECUTOR.submit(self._post_order_line, url, line_data) for line_data in line_datas]
+        # Collect results in line order (raises the first failed line's error)
+        return [future.result() for future in futures]
+
+    def create_sales_order_from_dict(self, order_data, source="order data"):
+        """Create a sales order from already loaded order data (source is only used in log messages).
+        
+        Raises InvalidOrderError for orders missing required fields; other errors are logged and return None.
+        """
+        try:
+            if not order_data.get("order_details"):
+                logging.warning(f"No valid order details found in {source}")
+                return None
                 
-            except requests.exceptions.RequestException as e:
-                logging.error(f"Error creating order line: {str(e)}")
-                if hasattr(e.response, 'text'):
-                    logging.error(f"Response: {e.response.text}")
-                raise
+            return self.create_sales_order(order_data)
+            
+        except InvalidOrderError:
+            raise
+        except Exception as e:
+            logging.error(f"Error processing {source}: {str(e)}")
+            return None
 
     def process_order_file(self, order_file_path):
         """Process a single order file and create it in Business Central."""
         try:
             logging.info(f"Processing order file: {order_file_path}")
             
-            with open(order_file_path, 'r') as f:
-                order_data = json.load(f)
+            order_data = _load_order_file(order_file_path)
             
-            if not order_data.get("order_details"):
-                logging.warning(f"No valid order details found in {order_file_path}")
-                return None
-                
-            return self.create_sales_order(order_data)
+            return self.create_sales_order_from_dict(order_data, order_file_path)
             
         except Exception as e:
             logging.error(f"Error processing {order_file_path}: {str(e)}")
@@ -898,6 +1525,21 @@ except Exception as e:
     logging.error(f"Failed to initialize Business Central service: {str(e)}")
     bc_service_available = False
 
+def _find_order_files(directory):
+    """Yield the identified_order.json paths in directory and its immediate subdirectories (the email folders).
+    
+    Only the top-level entries are listed; attachments/ and other nested folders are not descended into.
+    """
+    order_file = os.path.join(directory, "identified_order.json")
+    if os.path.isfile(order_file):
+        yield order_file
+    with os.scandir(directory) as entries:
+        email_folders = sorted(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+    for email_folder in email_folders:
+        order_file = os.path.join(email_folder, "identified_order.json")
+        if os.path.isfile(order_file):
+            yield order_file
+
 # Helper function for processing a single order
 def _process_single_order(order_file_path: str) -> Dict[str, Any]:
     """Helper function to process a single order file."""
@@ -917,11 +1559,10 @@ def _process_single_order(order_file_path: str) -> Dict[str, Any]:
             }
         
         # Load the order data
-        with open(order_file_path, 'r', encoding='utf-8') as f:
-            order_data = json.load(f)
+        order_data = _load_order_file(order_file_path)
         
         # Extract order details
-        order_details = order_data.get("order_details", {})
+        order_details = order_data.get("order_details") or {}
         customer_info = order_details.get("customer_info", {})
         
         # Log the order being processed
@@ -930,7 +1571,8 @@ def _process_single_order(order_file_path: str) -> Dict[str, Any]:
         
         # Use the Business Central service to create the sales order
         try:
-            result = bc_service.process_order_file(order_file_path)
+            # Pass the already loaded order data, so the file is only read once
+            result = bc_service.create_sales_order_from_dict(order_data, order_file_path)
             
             if result:
                 # Create a response with the order details and assigned order number
@@ -945,8 +1587,7 @@ def _process_single_order(order_file_path: str) -> Dict[str, Any]:
                 
                 # Save the response to a file in the same directory as the order
                 response_file_path = os.path.join(os.path.dirname(order_file_path), "bc_response.json")
-                with open(response_file_path, 'w', encoding='utf-8') as f:
-                    json.dump(response, f, indent=2, ensure_ascii=False)
+                _dump_json_file(response, response_file_path)
                 
                 logging.info(f"Order posted successfully: {result['order_number']}")
                 return response
@@ -955,6 +1596,14 @@ def _process_single_order(order_file_path: str) -> Dict[str, Any]:
                     "success": False,
                     "error": "Failed to create sales order in Business Central. Check logs for details."
                 }
+        except InvalidOrderError as e:
+            # The order is validated by create_sales_order before any request is made
+            error_message = f"Invalid order in {order_file_path}: {str(e)}"
+            logging.warning(error_message)
+            return {
+                "success": False,
+                "error": error_message
+            }
         except Exception as e:
             error_message = f"Error creating sales order in Business Central: {str(e)}"
             logging.error(error_message)
@@ -972,6 +1621,7 @@ def _process_single_order(order_file_path: str) -> Dict[str, Any]:
         }
 
 @function_tool
+@runs_in_thread
 def post_order_to_business_central(order_file_path: str) -> Dict[str, Any]:
     """
     Post a single identified order to Business Central.
@@ -991,6 +1641,7 @@ def post_order_to_business_central(order_file_path: str) -> Dict[str, Any]:
     return _process_single_order(order_file_path)
 
 @function_tool
+@runs_in_thread
 def post_all_orders_to_business_central(emails_dir_path: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Post all identified orders to Business Central.
@@ -1021,10 +1672,7 @@ def post_all_orders_to_business_central(emails_dir_path: Optional[str] = None) -
             }]
         
         # Find all identified_order.json files
-        order_files = []
-        for root, _, files in os.walk(emails_dir_path):
-            if "identified_order.json" in files:
-                order_files.append(os.path.join(root, "identified_order.json"))
+        order_files = list(_find_order_files(emails_dir_path))
         
         if not order_files:
             return [{
@@ -1034,21 +1682,26 @@ def post_all_orders_to_business_central(emails_dir_path: Optional[str] = None) -
         
         logging.info(f"Found {len(order_files)} order files to process")
         
-        # Process each order file
+        # Each order is dominated by Business Central round-trips, so post them in parallel
         results = []
-        for order_file in order_files:
-            logging.info(f"Processing order file: {order_file}")
-            try:
-                result = _process_single_order(order_file)
-                results.append(result)
-            except Exception as e:
-                error_message = f"Error processing {order_file}: {str(e)}"
-                logging.error(error_message)
-                results.append({
-                    "success": False,
-                    "error": error_message,
-                    "file": order_file
-                })
+        with ThreadPoolExecutor(max_workers=min(ORDER_POSTING_WORKERS, len(order_files))) as executor:
+            futures = []
+            for order_file in order_files:
+                logging.info(f"Processing order file: {order_file}")
+                futures.append(executor.submit(_process_single_order, order_file))
+            
+            # Collect results in file order
+            for order_file, future in zip(order_files, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    error_message = f"Error processing {order_file}: {str(e)}"
+                    logging.error(error_message)
+                    results.append({
+                        "success": False,
+                        "error": error_message,
+                        "file": order_file
+                    })
         
         # Create a summary
         success_count = sum(1 for r in results if r.get("success", False))